@@ -1,31 +1,92 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
-from app.services import audio_service
-from app.models.audio_schemas import SinglePredictionResult, BatchProcessingResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Depends
+from fastapi.responses import Response, ORJSONResponse
+from typing import List, Optional
+from app.services import audio_service, serialization_service
+from app.services.scratch_service import ScratchSpaceExhausted
+from app.services.resource_governor import governor
+from app.models.audio_schemas import SinglePredictionResult, BatchProcessingResponse, CompactBatchResponse
 
 router = APIRouter()
 
+RESPONSE_FORMATS = ("full", "topk", "compact")
+ENCODINGS = ("json", "msgpack", "npz")
+
+def _encoded_response(content, encoding: str) -> Response:
+    """Serializes a payload without going through response_model validation."""
+    if encoding == "msgpack":
+        return Response(content=serialization_service.to_msgpack(content), media_type=serialization_service.MSGPACK_MEDIA_TYPE)
+    if encoding == "npz":
+        return Response(
+            content=serialization_service.to_npz(content),
+            media_type=serialization_service.NPZ_MEDIA_TYPE,
+            headers={"Content-Disposition": "attachment; filename=predictions.npz"}
+        )
+    return ORJSONResponse(content=content)
+
 # This endpoint no longer needs to be async, as the service will run sequentially
-@router.post("/predict", tags=["Audio Classification"], response_model=SinglePredictionResult)
-def predict_single_file(file: UploadFile = File(...)):
+@router.post("/predict", tags=["Audio Classification"], response_model=SinglePredictionResult,
+             dependencies=[Depends(governor.admission("predict"))])
+def predict_single_file(
+    file: UploadFile = File(...),
+    top_k: Optional[int] = Query(None, ge=1, description="Only return the top_k class confidences"),
+    encoding: str = Query("json", description="'json' or 'msgpack'")
+):
     # This function's logic is simple and can stay as is, but we make it synchronous
     # for consistency. The service will handle temp files.
+    if encoding not in ("json", "msgpack"):
+        raise HTTPException(status_code=400, detail="Unsupported encoding. Use 'json' or 'msgpack'.")
     try:
-        result = audio_service.predict_single_uploaded_file(file)
-        return result
+        result = audio_service.predict_single_uploaded_file(file, top_k)
     except audio_service.AudioServiceError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except ScratchSpaceExhausted as e:
+        raise HTTPException(status_code=507, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
+    if encoding == "json" and top_k is None:
+        return result
+    return _encoded_response(result, encoding)
+
 # This endpoint also becomes synchronous
-@router.post("/batch", tags=["Audio Classification"], response_model=BatchProcessingResponse)
-def predict_batch(files: List[UploadFile] = File(...)):
+@router.post(
+    "/batch", tags=["Audio Classification"], response_model=BatchProcessingResponse,
+    dependencies=[Depends(governor.admission("predict"))],
+    responses={200: {"description": "BatchProcessingResponse, or CompactBatchResponse when response_format=compact",
+                     "model": CompactBatchResponse}}
+)
+def predict_batch(
+    files: List[UploadFile] = File(...),
+    response_format: str = Query("full", description="'full' (default), 'topk' or 'compact'"),
+    top_k: int = Query(3, ge=1, description="Number of classes kept per file when response_format=topk"),
+    encoding: str = Query("json", description="'json', 'msgpack', or 'npz' (compact only)")
+):
     """
     Accepts multiple audio files and processes them SEQUENTIALLY to save memory.
+
+    The default response is unchanged. 'topk' keeps only the top_k confidences per
+    file; 'compact' returns one class-label header plus a float32 score matrix. Any
+    non-default format or encoding skips response validation and is serialized
+    directly (orjson for JSON), which matters for large batches with many classes.
     """
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported response_format. Use one of {', '.join(RESPONSE_FORMATS)}.")
+    if encoding not in ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"Unsupported encoding. Use one of {', '.join(ENCODINGS)}.")
+    if encoding == "npz" and response_format != "compact":
+        raise HTTPException(status_code=400, detail="The 'npz' encoding is only available with response_format=compact.")
+
     try:
-        batch_results = audio_service.process_batch_files_sequentially(files)
-        return {"results": batch_results}
+        if response_format == "compact":
+            content = audio_service.process_batch_files_compact(files)
+        else:
+            batch_results = audio_service.process_batch_files_sequentially(
+                files, top_k if response_format == "topk" else None
+            )
+            content = {"results": batch_results}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected server error occurred during batch processing: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An unexpected server error occurred during batch processing: {e}")
+
+    if response_format == "full" and encoding == "json":
+        return content
+    return _encoded_response(content, encoding)
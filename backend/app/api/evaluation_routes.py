@@ -1,12 +1,19 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
 from app.services import evaluation_service
-from app.models.evaluation_schemas import EvaluationResponse
+from app.services.scratch_service import ScratchSpaceExhausted
+from app.services.resource_governor import governor
+from app.models.evaluation_schemas import (
+    EvaluationResponse, ShardedEvaluationRequest, ShardedEvaluationResponse,
+    ModelComparisonResponse, RescoreRequest, RescoreResponse, ApproximateEvaluationResponse,
+)
 
 
 router = APIRouter()
 
-@router.post("/run", tags=["Model Evaluation"], response_model=EvaluationResponse)
-async def run_model_evaluation(file: UploadFile = File(...)):
+@router.post("/run", tags=["Model Evaluation"], response_model=EvaluationResponse,
+             dependencies=[Depends(governor.admission("evaluation"))])
+def run_model_evaluation(file: UploadFile = File(...)):
     """
     Accepts a .zip file of a labeled dataset, runs evaluation, and returns a
     comprehensive report.
@@ -24,10 +31,99 @@ async def run_model_evaluation(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Invalid file format. Only .zip files are allowed.")
 
     try:
-        result = await evaluation_service.run_evaluation(file)
+        result = evaluation_service.run_evaluation(file)
         return result
     except evaluation_service.EvaluationServiceError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except ScratchSpaceExhausted as e:
+        raise HTTPException(status_code=507, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected server error occurred during evaluation: {e}")
-    
+
+@router.post("/run_approximate", tags=["Model Evaluation"], response_model=ApproximateEvaluationResponse,
+             dependencies=[Depends(governor.admission("evaluation"))])
+def run_approximate_model_evaluation(
+    file: UploadFile = File(...),
+    target_ci_width: float = Query(0.05, gt=0, le=1, description="Stop once every confidence interval is narrower than this"),
+    confidence_level: float = Query(0.95, gt=0, lt=1),
+    time_budget_seconds: float = Query(30.0, gt=0, description="Stop once this budget is spent; checked before every batch, so a round may end early"),
+    files_per_class_per_round: int = Query(16, ge=1),
+    seed: Optional[int] = Query(None, description="Seed for reproducible sampling")
+):
+    """
+    Quick triage of a checkpoint on a large labeled .zip (same structure as /run).
+    Scores a stratified random sample per class folder in rounds and reports
+    accuracy and per-class recall with confidence intervals, stopping early once
+    they are tight enough or the time budget runs out.
+    """
+    if not file.filename.lower().endswith(".zip"):
+        raise HTTPException(status_code=400, detail="Invalid file format. Only .zip files are allowed.")
+
+    try:
+        return evaluation_service.run_approximate_evaluation(
+            file, target_ci_width, confidence_level, time_budget_seconds, files_per_class_per_round, seed
+        )
+    except evaluation_service.EvaluationServiceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ScratchSpaceExhausted as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected server error occurred during evaluation: {e}")
+
+@router.post("/runs/{run_id}/rescore", tags=["Model Evaluation"], response_model=RescoreResponse)
+def rescore_evaluation_run(run_id: str, request: RescoreRequest):
+    """
+    Recomputes metrics for a previous evaluation run from its stored per-file logits,
+    with optional label mapping, class subset, top-k accuracy and confidence
+    thresholds. No audio is decoded and no inference is run.
+    """
+    try:
+        return evaluation_service.rescore_evaluation_run(
+            run_id, request.label_mapping, request.class_subset, request.top_k,
+            request.confidence_threshold, request.threshold_sweep
+        )
+    except evaluation_service.EvaluationServiceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected server error occurred during rescoring: {e}")
+
+@router.post("/run_sharded", tags=["Model Evaluation"], response_model=ShardedEvaluationResponse,
+             dependencies=[Depends(governor.admission("evaluation"))])
+def run_sharded_model_evaluation(request: ShardedEvaluationRequest):
+    """
+    Evaluates a labeled dataset directory that already lives on the server, splitting
+    it into shards processed by a pool of worker processes. Finished shards are
+    checkpointed, so re-submitting the same request after an interruption resumes
+    where the previous run stopped.
+    """
+    try:
+        return evaluation_service.run_sharded_evaluation(
+            request.dataset_path, request.model_filename, request.num_workers, request.shard_size, request.resume
+        )
+    except evaluation_service.EvaluationServiceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected server error occurred during evaluation: {e}")
+
+@router.post("/compare", tags=["Model Evaluation"], response_model=ModelComparisonResponse,
+             dependencies=[Depends(governor.admission("evaluation"))])
+def compare_models(
+    file: UploadFile = File(...),
+    model_filenames: List[str] = Form(..., description="Model files in temp_uploads; repeat the field once per model")
+):
+    """
+    Evaluates several models on the same labeled .zip dataset (same structure as /run).
+    Audio is decoded and featurized once and every model runs on the same batches,
+    so comparing N models costs one decode pass plus N forward passes.
+    """
+    if not file.filename.lower().endswith(".zip"):
+        raise HTTPException(status_code=400, detail="Invalid file format. Only .zip files are allowed.")
+
+    try:
+        return evaluation_service.run_model_comparison(file, model_filenames)
+    except evaluation_service.EvaluationServiceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ScratchSpaceExhausted as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected server error occurred during comparison: {e}")
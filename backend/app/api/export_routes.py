@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Body
-from fastapi.responses import Response, JSONResponse, HTMLResponse
+from fastapi import APIRouter, Body, HTTPException
+from fastapi.responses import Response, JSONResponse, HTMLResponse, FileResponse
 from datetime import datetime
 import json
+import os
 
-from app.services import export_service
+from app.services import export_service, evaluation_run_service
 from app.models.export_schemas import BatchExportRequest, EvaluationExportRequest
 
 router = APIRouter()
@@ -53,4 +54,18 @@ def export_evaluation_report(
     return HTMLResponse(
         content=html_content,
         headers={"Content-Disposition": "attachment; filename=evaluation_report.html"}
-    )
\ No newline at end of file
+    )
+
+@router.get("/evaluation_run/{run_id}", tags=["Data Export"])
+def export_evaluation_run(run_id: str):
+    """
+    Downloads the stored artifact of an evaluation run: an .npz archive with the
+    per-file logits, true labels, file ids and class labels.
+    """
+    try:
+        path = evaluation_run_service.run_path(run_id)
+    except evaluation_run_service.EvaluationRunError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Evaluation run not found: {run_id}")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"evaluation_run_{run_id}.npz")
@@ -2,11 +2,12 @@ from fastapi import APIRouter, UploadFile, File, HTTPException
 import os
 from app.models.model_schemas import ModelLoadRequest
 # Correct, absolute import of the singleton instance
-from app.services.model_services import model_loader
+from app.services.model_services import model_loader, UPLOAD_DIRECTORY
+from app.services.scratch_service import scratch_manager, ScratchSpaceExhausted
+from app.services import shared_model_service
+from app.core.config import settings
 
 router = APIRouter()
-UPLOAD_DIRECTORY = "./temp_uploads"
-os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
 MAX_FILE_SIZE = 500 * 1024 * 1024
 
 @router.post("/upload", tags=["Model Management"])
@@ -14,15 +15,19 @@ async def upload_model(file: UploadFile = File(...)):
     if not (file.filename.endswith(".pt") or file.filename.endswith(".pth")):
         raise HTTPException(status_code=400, detail="Invalid file format. Only .pt or .pth files are allowed.")
 
-    file_path = os.path.join(UPLOAD_DIRECTORY, file.filename)
+    file_path = os.path.join(UPLOAD_DIRECTORY, os.path.basename(file.filename))
     
     try:
+        content = await file.read()
+        if len(content) > MAX_FILE_SIZE:
+            raise HTTPException(status_code=413, detail=f"File size exceeds the limit.")
+        scratch_manager.root("models").admit(len(content))
         with open(file_path, "wb") as buffer:
-            content = await file.read()
-            if len(content) > MAX_FILE_SIZE:
-                os.remove(file_path)
-                raise HTTPException(status_code=413, detail=f"File size exceeds the limit.")
             buffer.write(content)
+    except HTTPException:
+        raise
+    except ScratchSpaceExhausted as e:
+        raise HTTPException(status_code=507, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"There was an error uploading the file: {e}")
     finally:
@@ -33,6 +38,9 @@ async def upload_model(file: UploadFile = File(...)):
 @router.post("/load", tags=["Model Management"])
 def load_model(request: ModelLoadRequest):
     try:
+        if settings.SHARED_MODELS_ENABLED:
+            # One load switches every worker on the node
+            return shared_model_service.load_and_publish(request.filename)
         metadata = model_loader.load_model(request.filename)
         return metadata
     except Exception as e:
@@ -1,3 +1,4 @@
+from typing import List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -7,8 +8,64 @@ class Settings(BaseSettings):
     ANTHROPIC_API_KEY: str = "default_key_if_not_set"
     DEEPSEEK_API_KEY: str = "default_key_if_not_set"
 
+    # Startup options. Checkpoints listed here (filenames inside temp_uploads) are
+    # loaded when the server boots; the first one becomes the active model. With
+    # SHARED_MODELS_ENABLED they are only loaded to publish when no shared model exists.
+    # From the environment, lists are given as JSON, e.g. PRELOAD_MODELS='["trained_model.pth"]'
+    PRELOAD_MODELS: List[str] = []
+    # Push synthetic audio through decode -> mel -> forward once per batch size so
+    # the first real request doesn't pay for lazy initialisation.
+    WARMUP_ENABLED: bool = True
+    WARMUP_BATCH_SIZES: List[int] = [1]
+    WARMUP_AUDIO_SECONDS: float = 2.0
+    # Models kept in memory besides the preloaded and active ones (e.g. from /compare),
+    # least recently used first out
+    MODEL_CACHE_SIZE: int = 2
+
+    # Resource governor. The core budget (0 = all cores) is split between concurrent
+    # inferences and torch threads: torch gets CPU_CORE_BUDGET // INFERENCE_CONCURRENCY.
+    CPU_CORE_BUDGET: int = 0
+    INFERENCE_CONCURRENCY: int = 2
+    DECODE_CONCURRENCY: int = 0  # 0 = one per budgeted core
+    EVALUATION_CONCURRENCY: int = 1
+    # Requests beyond the concurrency wait in a bounded queue for a bounded time,
+    # after which they get 503 with Retry-After.
+    ADMISSION_QUEUE_SIZE: int = 16
+    ADMISSION_TIMEOUT_SECONDS: float = 10.0
+    RETRY_AFTER_SECONDS: int = 2
+
+    # Sharded evaluation: worker processes (0 = the budgeted cores not reserved for
+    # concurrent inferences, at least one) and files per shard
+    EVALUATION_WORKERS: int = 0
+    EVALUATION_SHARD_SIZE: int = 256
+    # /run_sharded only evaluates dataset directories below this root
+    EVALUATION_DATASET_ROOT: str = "./evaluation_datasets"
+
+    # Scratch space. Per-request audio can be moved to tmpfs (e.g. /dev/shm/asc_audio);
+    # models, checkpoints and run artifacts should stay on disk.
+    MODEL_STORAGE_DIR: str = "./temp_uploads"
+    SCRATCH_AUDIO_DIR: str = "./temp_audio_uploads"
+    SCRATCH_EVALUATION_DIR: str = "./temp_evaluation"
+    EVALUATION_CHECKPOINT_DIR: str = "./evaluation_checkpoints"
+    EVALUATION_RUNS_DIR: str = "./evaluation_runs"
+    # Most scratch space a single request may hold at once (e.g. an extracted zip)
+    SCRATCH_REQUEST_QUOTA_MB: int = 4096
+    # Writes are refused when they would leave less than this free on the device
+    SCRATCH_MIN_FREE_MB: int = 1024
+    # The janitor deletes entries no live request owns once they are older than this
+    SCRATCH_JANITOR_INTERVAL_SECONDS: int = 300
+    SCRATCH_ORPHAN_MAX_AGE_SECONDS: int = 3600
+    EVALUATION_ARTIFACT_MAX_AGE_SECONDS: int = 7 * 24 * 3600
+
+    # Cross-worker model sharing. A /api/model/load writes the weights once to
+    # SHARED_MODEL_DIR (keep it on tmpfs) and every uvicorn worker on the node maps
+    # them read-only, checking for newly published models every poll interval.
+    SHARED_MODELS_ENABLED: bool = False
+    SHARED_MODEL_DIR: str = "/dev/shm/asc_shared_models"
+    SHARED_MODEL_POLL_SECONDS: float = 0.5
+
     # This tells pydantic to load variables from a .env file
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding='utf-8')
 
 # Create a single, importable instance of the settings
-settings = Settings()
\ No newline at end of file
+settings = Settings()
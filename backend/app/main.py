@@ -1,7 +1,13 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 # Correct, absolute imports for all routers
 from app.api import model_routes, audio_routes, evaluation_routes, ai_routes, export_routes
+from app.services import startup_service
+from app.services.scratch_service import scratch_manager
+from app.services.resource_governor import governor, Overloaded
+from app.services.shared_model_service import shared_model_watcher
 
 app = FastAPI(
     title="Universal ASC Model Evaluator",
@@ -22,6 +28,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(Overloaded)
+async def handle_overloaded(request: Request, exc: Overloaded):
+    # Fast rejection instead of letting the request queue up behind saturated workers
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
+
 # Include the routers
 app.include_router(model_routes.router, prefix="/api/model")
 app.include_router(audio_routes.router, prefix="/api/audio")
@@ -29,10 +40,29 @@ app.include_router(evaluation_routes.router, prefix="/api/evaluation")
 app.include_router(ai_routes.router, prefix="/api/ai")
 app.include_router(export_routes.router, prefix="/api/export")
 
+@app.on_event("startup")
+async def start_preload_and_warmup():
+    governor.configure_torch()
+    scratch_manager.start_janitor()
+    # Runs in a worker thread so liveness checks are answered while models load;
+    # /api/ready reports 503 until the sequence has finished.
+    asyncio.get_running_loop().run_in_executor(None, startup_service.run_startup_sequence)
+
 @app.get("/", tags=["General"])
 def read_root():
     return {"message": "Welcome to the Universal ASC Model Evaluator API"}
 
 @app.get("/api/health", tags=["General"])
 def get_health_status():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+@app.get("/api/ready", tags=["General"])
+def get_readiness_status():
+    status = startup_service.get_status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+@app.get("/api/metrics", tags=["General"])
+def get_metrics():
+    return {"scratch": scratch_manager.usage(), "governor": governor.stats(), "shared_model": shared_model_watcher.status()}
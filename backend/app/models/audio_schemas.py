@@ -20,4 +20,18 @@ class BatchResultItem(BaseModel):
 
 class BatchProcessingResponse(BaseModel):
     """The final response structure for a batch processing request."""
-    results: List[BatchResultItem]
\ No newline at end of file
+    results: List[BatchResultItem]
+
+class CompactBatchResponse(BaseModel):
+    """
+    Columnar batch response (response_format=compact): one class-label header and a
+    float32 score matrix instead of a confidence dict per file. Rows of failed files
+    have NaN scores and a predicted_index of -1.
+    """
+    class_labels: List[str]
+    filenames: List[str]
+    status: List[str]
+    predicted_index: List[int]
+    confidence: List[Optional[float]]
+    scores: List[List[Optional[float]]]
+    error_messages: List[Optional[str]]
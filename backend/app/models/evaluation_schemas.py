@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Optional, Annotated
 
 class ClassMetrics(BaseModel):
     """Metrics for a single class (precision, recall, f1-score)."""
@@ -16,7 +16,101 @@ class EvaluationReport(BaseModel):
 class EvaluationResponse(BaseModel):
     """The final, comprehensive response for a model evaluation request."""
     overall_accuracy: float
-    classification_report: Dict[str, Union[ClassMetrics, Dict[str, float]]]
+    # 'accuracy' is a plain float, every other key a metrics dict
+    classification_report: Dict[str, Union[ClassMetrics, Dict[str, float], float]]
     confusion_matrix: List[List[int]]
-    dataset_statistics: Dict[str, int]
+    dataset_statistics: Dict[str, Union[int, Dict[str, int]]]
+    # Id of the stored per-file logits, usable with /runs/{run_id}/rescore
+    run_id: Optional[str] = None
 
+class ShardedEvaluationRequest(BaseModel):
+    """Request body for evaluating a server-side dataset directory across worker processes."""
+    dataset_path: str = Field(..., description="Directory relative to the server's dataset root, with one subfolder per class label")
+    model_filename: Optional[str] = Field(None, description="Model file in temp_uploads; defaults to the loaded model")
+    num_workers: int = Field(0, ge=0, description="Worker processes, capped at the configured maximum; 0 uses that maximum")
+    shard_size: int = Field(0, ge=0, description="Files per shard; 0 uses the configured default")
+    resume: bool = Field(True, description="Reuse finished shards of an interrupted identical run")
+
+class ShardedEvaluationResponse(EvaluationResponse):
+    """
+    An evaluation report plus the bookkeeping of the sharded run that produced it.
+    Sharded runs do not store logits, so run_id stays empty; checkpoint_id identifies
+    the shard checkpoints a re-submitted run resumes from.
+    """
+    checkpoint_id: str
+    shards_total: int
+    shards_resumed: int
+    failed_files: int
+
+
+class ModelComparisonItem(BaseModel):
+    """The evaluation report of one model in a comparison."""
+    model_filename: str
+    evaluation: EvaluationResponse
+
+class PairwiseDisagreement(BaseModel):
+    """How two compared models differ on the same files."""
+    model_a: str
+    model_b: str
+    disagreements: int
+    disagreement_rate: float
+    only_a_correct: int
+    only_b_correct: int
+    both_correct: int
+    both_wrong: int
+
+class ModelComparisonResponse(BaseModel):
+    """The response for evaluating several models on one dataset."""
+    results: List[ModelComparisonItem]
+    pairwise_disagreement: List[PairwiseDisagreement]
+
+class RescoreRequest(BaseModel):
+    """Options for recomputing metrics from the stored logits of an evaluation run."""
+    label_mapping: Optional[Dict[str, str]] = Field(None, description="Renames or merges labels on both the true and predicted side")
+    class_subset: Optional[List[str]] = Field(None, description="Only score files of these classes, choosing among these outputs")
+    top_k: List[Annotated[int, Field(ge=1)]] = Field([1], description="k values to report top-k accuracy for")
+    confidence_threshold: Optional[float] = Field(None, ge=0.0, le=1.0, description="Only score files whose top confidence reaches this value")
+    threshold_sweep: List[Annotated[float, Field(ge=0.0, le=1.0)]] = Field([], description="Thresholds to report coverage and accuracy at")
+
+class ThresholdSweepPoint(BaseModel):
+    """Coverage and accuracy when only predictions at or above a confidence threshold are kept."""
+    threshold: float
+    coverage: float
+    accuracy: Optional[float] = None
+
+class RescoreResponse(EvaluationResponse):
+    """Metrics recomputed from a stored evaluation run."""
+    coverage: float
+    top_k_accuracy: Dict[str, float]
+    threshold_sweep: List[ThresholdSweepPoint]
+
+class ClassRecallEstimate(BaseModel):
+    """Estimated recall of one class from a sample, with its confidence interval."""
+    recall: float
+    ci_low: float
+    ci_high: float
+    sampled: int
+    population: int
+    failed: int
+
+class ApproximateEvaluationRound(BaseModel):
+    """The state of a progressive evaluation after one sampling round."""
+    round: int
+    files_scored: int
+    elapsed_seconds: float
+    accuracy: float
+    accuracy_ci: List[float]
+    max_ci_width: float
+    per_class: Dict[str, ClassRecallEstimate]
+
+class ApproximateEvaluationResponse(BaseModel):
+    """Sampling-based accuracy and per-class recall estimates with confidence intervals."""
+    overall_accuracy: float
+    accuracy_ci: List[float]
+    confidence_level: float
+    per_class: Dict[str, ClassRecallEstimate]
+    confusion_matrix: List[List[int]]
+    files_scored: int
+    total_files: int
+    stopped_reason: str = Field(..., description="'converged', 'time_budget' or 'exhausted'")
+    rounds: List[ApproximateEvaluationRound]
@@ -1,24 +1,139 @@
 import torch
 import librosa
 import numpy as np
-import os
-import uuid
-import shutil
 from fastapi import UploadFile
 from typing import List, Dict
 
 # Correct, absolute import of the singleton instance
 from app.services.model_services import model_loader, ModelServiceError
-
-TEMP_AUDIO_DIR = "./temp_audio_uploads"
-os.makedirs(TEMP_AUDIO_DIR, exist_ok=True)
+from app.services.scratch_service import scratch_manager
+from app.services.resource_governor import governor
+from app.services import wav_service
 
 # We can reuse the error class from the model service for consistency
 AudioServiceError = ModelServiceError
 
-def predict_audio_file(file_path: str) -> dict:
+# Front-end parameters shared by every code path that turns audio into model input
+DEFAULT_SAMPLE_RATE = 16000
+N_MELS = 128
+N_FFT = 2048
+HOP_LENGTH = 512
+TARGET_WIDTH = 512
+# Samples compute_log_mel reads to fill TARGET_WIDTH frames: frames are centred, so the
+# last one reaches N_FFT // 2 past its start. Anything after that is cropped anyway.
+WINDOW_SAMPLES = (TARGET_WIDTH - 1) * HOP_LENGTH + N_FFT // 2
+# Extra source audio decoded past the window when resampling, so the resampler's edge
+# effects at the cut land outside the frames that are kept
+RESAMPLE_MARGIN_SECONDS = 0.1
+
+def load_audio(file_path: str, target_sr: int, max_samples: int = None) -> np.ndarray:
+    """
+    Decodes an audio file to a mono float32 signal at the target sample rate. With
+    max_samples only the start of the file that many target-rate samples cover is decoded.
+
+    Uncompressed WAV is read from a memory map of its PCM data, converting just the
+    frames needed and skipping the resampler when the file is already at target_sr;
+    other formats (and WAV encodings the fast path doesn't handle) go through librosa.
+    """
+    with governor.slot("decode"):
+        if wav_service.is_wav_path(file_path):
+            try:
+                info = wav_service.read_header(file_path)
+                max_frames = None
+                if max_samples is not None:
+                    max_frames = max_samples if info.sample_rate == target_sr else \
+                        int(np.ceil((max_samples / target_sr + RESAMPLE_MARGIN_SECONDS) * info.sample_rate))
+                audio, native_sr = wav_service.read_frames(file_path, max_frames, info)
+                audio = resample_audio(audio, native_sr, target_sr)
+                return audio if max_samples is None else audio[:max_samples]
+            except wav_service.WavFormatError:
+                pass
+
+        duration = None if max_samples is None else max_samples / target_sr + RESAMPLE_MARGIN_SECONDS
+        audio, _ = librosa.load(file_path, sr=target_sr, mono=True, duration=duration)
+    return audio if max_samples is None else audio[:max_samples]
+
+def decode_audio(file_path: str, max_seconds: float = None) -> tuple:
+    """
+    Decodes an audio file to mono at its native sample rate, returning (audio, sr).
+    With max_seconds only the start of the file is decoded, via the same WAV fast path
+    as load_audio.
+    """
+    with governor.slot("decode"):
+        if wav_service.is_wav_path(file_path):
+            try:
+                info = wav_service.read_header(file_path)
+                max_frames = None if max_seconds is None else int(np.ceil(max_seconds * info.sample_rate))
+                return wav_service.read_frames(file_path, max_frames, info)
+            except wav_service.WavFormatError:
+                pass
+        return librosa.load(file_path, sr=None, mono=True, duration=max_seconds)
+
+def resample_audio(audio: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    """Resamples a decoded signal; equivalent to what load_audio does after decoding."""
+    if orig_sr == target_sr:
+        return audio
+    return librosa.resample(audio, orig_sr=orig_sr, target_sr=target_sr)
+
+def compute_log_mel(audio: np.ndarray, sr: int) -> np.ndarray:
+    """
+    Turns a mono signal into the fixed-size (N_MELS x TARGET_WIDTH) log-mel
+    spectrogram the model expects.
+    """
+    mel_spectrogram = librosa.feature.melspectrogram(y=audio, sr=sr, n_mels=N_MELS, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    if mel_spectrogram.shape[1] < TARGET_WIDTH:
+        mel_spectrogram = np.pad(mel_spectrogram, ((0, 0), (0, TARGET_WIDTH - mel_spectrogram.shape[1])), mode='constant')
+    else:
+        mel_spectrogram = mel_spectrogram[:, :TARGET_WIDTH]
+
+    return librosa.power_to_db(mel_spectrogram, ref=np.max).astype(np.float32)
+
+def run_model(model, features: np.ndarray) -> torch.Tensor:
+    """
+    Runs the model on a batch of log-mel spectrograms shaped (batch, N_MELS, TARGET_WIDTH)
+    and returns the raw logits shaped (batch, num_classes).
+    """
+    input_tensor = torch.from_numpy(features).float().unsqueeze(1)
+    with governor.slot("inference"), torch.no_grad():
+        return model(input_tensor)
+
+def run_inference(model, features: np.ndarray) -> torch.Tensor:
+    """Like run_model, but returns the softmax probabilities."""
+    return torch.nn.functional.softmax(run_model(model, features), dim=1)
+
+def label_for_index(index: int, class_labels: list) -> str:
+    """Maps a model output index to its class label, falling back to 'Class_<i>'."""
+    return class_labels[index] if index < len(class_labels) else f"Class_{index}"
+
+def format_prediction(probabilities, class_labels: list, top_k: int = None) -> dict:
     """
-    Core prediction function. Takes a file path, loads it, and returns a prediction.
+    Builds the prediction dict for a single row of class probabilities. With top_k,
+    all_class_confidences only holds the top_k most likely classes.
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float32)
+    predicted_class_index = int(probabilities.argmax())
+    predicted_class = label_for_index(predicted_class_index, class_labels)
+    confidence = float(probabilities[predicted_class_index])
+
+    if top_k:
+        indices = np.argsort(-probabilities, kind="stable")[:top_k]
+    else:
+        indices = range(len(probabilities))
+
+    all_class_confidences = {}
+    for i in indices:
+        all_class_confidences[label_for_index(int(i), class_labels)] = float(probabilities[i])
+        
+    return {
+        "predicted_class": predicted_class,
+        "confidence": round(confidence, 4),
+        "all_class_confidences": all_class_confidences
+    }
+
+def predict_audio_probabilities(file_path: str) -> tuple:
+    """
+    Core prediction function. Takes a file path, loads it, and returns the class
+    probabilities as a float32 array together with the model's class labels.
     """
     try:
         model, metadata = model_loader.get_model()
@@ -26,81 +141,112 @@ def predict_audio_file(file_path: str) -> dict:
         raise AudioServiceError(str(e))
         
     try:
-        target_sr = metadata.sample_rate if metadata.sample_rate else 16000
-        audio, sr = librosa.load(file_path, sr=target_sr, mono=True)
-        
-        mel_spectrogram = librosa.feature.melspectrogram(y=audio, sr=sr, n_mels=128, n_fft=2048, hop_length=512)
-        target_width = 512
-        if mel_spectrogram.shape[1] < target_width:
-            mel_spectrogram = np.pad(mel_spectrogram, ((0, 0), (0, target_width - mel_spectrogram.shape[1])), mode='constant')
-        else:
-            mel_spectrogram = mel_spectrogram[:, :target_width]
-            
-        log_mel_spectrogram = librosa.power_to_db(mel_spectrogram, ref=np.max)
-        input_tensor = torch.from_numpy(log_mel_spectrogram).float().unsqueeze(0).unsqueeze(0)
+        target_sr = metadata.sample_rate if metadata.sample_rate else DEFAULT_SAMPLE_RATE
+        audio = load_audio(file_path, target_sr, WINDOW_SAMPLES)
+        log_mel_spectrogram = compute_log_mel(audio, target_sr)
     except Exception as e:
         print(f"[ERROR] Librosa/PyTorch processing failed: {e}")
         raise AudioServiceError(f"Failed to process audio file: {e}")
-        
-    with torch.no_grad():
-        output = model(input_tensor)
-        
-    probabilities = torch.nn.functional.softmax(output, dim=1)[0]
-    top_prob, top_idx = torch.max(probabilities, 0)
-    predicted_class_index = top_idx.item()
-    confidence = top_prob.item()
-    
+
+    probabilities = run_inference(model, log_mel_spectrogram[np.newaxis])[0].numpy()
     class_labels = metadata.class_labels if metadata.class_labels else []
-    
-    if predicted_class_index < len(class_labels):
-        predicted_class = class_labels[predicted_class_index]
-    else:
-        predicted_class = f"Class_{predicted_class_index}"
-        
-    all_class_confidences = {}
-    for i, prob in enumerate(probabilities):
-        label = class_labels[i] if i < len(class_labels) else f"Class_{i}"
-        all_class_confidences[label] = prob.item()
-        
-    return {
-        "predicted_class": predicted_class,
-        "confidence": round(confidence, 4),
-        "all_class_confidences": all_class_confidences
-    }
+    return probabilities, class_labels
 
-def process_batch_files_sequentially(files: List[UploadFile]) -> List[Dict]:
+def predict_audio_file(file_path: str, top_k: int = None) -> dict:
     """
-    Processes a batch of audio files one by one to conserve memory.
+    Takes a file path, loads it, and returns a prediction dict.
     """
-    results = []
+    probabilities, class_labels = predict_audio_probabilities(file_path)
+    return format_prediction(probabilities, class_labels, top_k)
+
+def predict_single_uploaded_file(file: UploadFile, top_k: int = None) -> dict:
+    """
+    Saves an uploaded file to a scratch lease, predicts it and cleans up.
+    """
+    with scratch_manager.lease("audio") as scratch:
+        temp_file_path = scratch.save_stream(file.file, file.filename)
+        return predict_audio_file(temp_file_path, top_k)
+
+def predict_batch_probabilities(files: List[UploadFile]) -> tuple:
+    """
+    Processes a batch of audio files one by one to conserve memory. Returns the class
+    labels and one item per file with its filename, probabilities (None on failure)
+    and error message.
+    """
+    class_labels = None
+    items = []
     print("\n--- Starting Sequential Batch Processing ---")
-    for i, file in enumerate(files):
-        temp_file_path = os.path.join(TEMP_AUDIO_DIR, f"{uuid.uuid4()}_{file.filename}")
-        print(f"Processing file {i+1}/{len(files)}: {file.filename}")
-        try:
-            with open(temp_file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            print(f"  - Saved to temp file.")
+    with scratch_manager.lease("audio") as scratch:
+        for i, file in enumerate(files):
+            temp_file_path = scratch.file_path(file.filename)
+            print(f"Processing file {i+1}/{len(files)}: {file.filename}")
+            try:
+                scratch.save_stream(file.file, file.filename)
+                print(f"  - Saved to temp file.")
             
-            prediction_result = predict_audio_file(temp_file_path)
-            print(f"  - Prediction successful: {prediction_result['predicted_class']}")
-            results.append({
-                "filename": file.filename,
-                "status": "success",
-                "prediction": prediction_result,
-                "error_message": None
-            })
-        except Exception as e:
-            print(f"  - FAILED to process file. Error: {e}")
+                probabilities, labels = predict_audio_probabilities(temp_file_path)
+                if class_labels is None:
+                    class_labels = [label_for_index(j, labels) for j in range(len(probabilities))]
+                print(f"  - Prediction successful: {label_for_index(int(probabilities.argmax()), labels)}")
+                items.append({"filename": file.filename, "probabilities": probabilities, "error_message": None})
+            except Exception as e:
+                print(f"  - FAILED to process file. Error: {e}")
+                items.append({"filename": file.filename, "probabilities": None, "error_message": str(e)})
+            finally:
+                scratch.remove(temp_file_path)
+    
+    print("--- Sequential Batch Processing Complete ---\n")
+    return class_labels or [], items
+
+def process_batch_files_sequentially(files: List[UploadFile], top_k: int = None) -> List[Dict]:
+    """
+    Processes a batch of audio files one by one and returns one BatchResultItem dict
+    per file. With top_k, each prediction only lists the top_k classes.
+    """
+    class_labels, items = predict_batch_probabilities(files)
+    results = []
+    for item in items:
+        if item["probabilities"] is None:
             results.append({
-                "filename": file.filename,
+                "filename": item["filename"],
                 "status": "error",
                 "prediction": None,
-                "error_message": str(e)
+                "error_message": item["error_message"]
             })
-        finally:
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-    
-    print("--- Sequential Batch Processing Complete ---\n")
-    return results
\ No newline at end of file
+        else:
+            results.append({
+                "filename": item["filename"],
+                "status": "success",
+                "prediction": format_prediction(item["probabilities"], class_labels, top_k),
+                "error_message": None
+            })
+    return results
+
+def process_batch_files_compact(files: List[UploadFile]) -> dict:
+    """
+    Processes a batch and returns it in columnar form: a single class-label header,
+    a float32 (files x classes) score matrix, and per-file columns. Rows of files that
+    failed hold NaN scores and a predicted index of -1.
+    """
+    class_labels, items = predict_batch_probabilities(files)
+    scores = np.full((len(items), len(class_labels)), np.nan, dtype=np.float32)
+    for row, item in enumerate(items):
+        if item["probabilities"] is not None:
+            scores[row] = item["probabilities"]
+
+    succeeded = np.array([item["probabilities"] is not None for item in items], dtype=bool)
+    predicted_index = np.full(len(items), -1, dtype=np.int32)
+    confidence = np.full(len(items), np.nan, dtype=np.float32)
+    if len(class_labels) and succeeded.any():
+        predicted_index[succeeded] = scores[succeeded].argmax(axis=1)
+        confidence[succeeded] = scores[succeeded].max(axis=1)
+
+    return {
+        "class_labels": class_labels,
+        "filenames": [item["filename"] for item in items],
+        "status": ["success" if ok else "error" for ok in succeeded],
+        "predicted_index": predicted_index,
+        "confidence": confidence,
+        "scores": scores,
+        "error_messages": [item["error_message"] for item in items],
+    }
@@ -0,0 +1,35 @@
+import os
+
+# Labelled-directory datasets: one subfolder of audio files per class label. Kept free
+# of the model/audio/scratch stack so command-line tools can import it cheaply.
+SUPPORTED_AUDIO_FORMATS = (".wav", ".mp3", ".m4a", ".flac")
+
+class DatasetError(Exception):
+    """Custom exception for dataset layout errors."""
+    pass
+
+def discover_class_labels(base_path: str) -> list:
+    """The dataset's class labels: its subfolder names, sorted."""
+    return sorted(d for d in os.listdir(base_path) if os.path.isdir(os.path.join(base_path, d)))
+
+def parse_dataset(base_path: str, class_labels: list) -> tuple[list, list]:
+    """
+    Walks a dataset directory, validates subfolders, and collects file paths and labels.
+    """
+    filepaths = []
+    true_labels = []
+
+    # REQ-004-1: Validate that folder names match model class labels
+    for folder in discover_class_labels(base_path):
+        if folder not in class_labels:
+            raise DatasetError(f"Dataset folder '{folder}' does not match any of the model's class labels.")
+
+    for root, _, files in os.walk(base_path):
+        for file in files:
+            if file.lower().endswith(SUPPORTED_AUDIO_FORMATS):
+                class_label = os.path.basename(root)
+                if class_label in class_labels:
+                    filepaths.append(os.path.join(root, file))
+                    true_labels.append(class_label)
+
+    return filepaths, true_labels
@@ -0,0 +1,58 @@
+import os
+import re
+import uuid
+import numpy as np
+
+from app.services.scratch_service import scratch_manager, ScratchSpaceExhausted
+
+# Every evaluation run leaves one .npz artifact here, holding the per-file logits,
+# true labels and file ids, so metrics can be recomputed without re-running inference.
+EVALUATION_RUNS_DIR = scratch_manager.root("runs").path
+
+_RUN_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+class EvaluationRunError(Exception):
+    """Custom exception for evaluation run artifact errors."""
+    pass
+
+def run_path(run_id: str) -> str:
+    """Returns the artifact path of a run, rejecting anything that isn't a run id."""
+    if not _RUN_ID_PATTERN.match(run_id):
+        raise EvaluationRunError(f"Invalid evaluation run id: {run_id}")
+    return os.path.join(EVALUATION_RUNS_DIR, f"{run_id}.npz")
+
+def save_run(logits: np.ndarray, true_labels: list, file_ids: list, class_labels: list,
+             report_labels: list, failed_file_ids: list, failed_labels: list, model_filename: str) -> str:
+    """
+    Stores a run and returns its id. class_labels names the logit columns (model output
+    order); report_labels is the label order used for the evaluation report.
+    """
+    try:
+        scratch_manager.root("runs").admit(np.asarray(logits).size * 4)
+    except ScratchSpaceExhausted as e:
+        raise EvaluationRunError(str(e))
+
+    run_id = uuid.uuid4().hex
+    final_path = run_path(run_id)
+    temp_path = final_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        np.savez(
+            f,
+            logits=np.asarray(logits, dtype=np.float32),
+            true_labels=np.array(true_labels, dtype=str),
+            file_ids=np.array(file_ids, dtype=str),
+            class_labels=np.array(class_labels, dtype=str),
+            report_labels=np.array(report_labels, dtype=str),
+            failed_file_ids=np.array(failed_file_ids, dtype=str),
+            failed_labels=np.array(failed_labels, dtype=str),
+            model_filename=np.array(model_filename or ""),
+        )
+    os.replace(temp_path, final_path)
+    return run_id
+
+def load_run(run_id: str) -> dict:
+    path = run_path(run_id)
+    if not os.path.exists(path):
+        raise EvaluationRunError(f"Evaluation run not found: {run_id}")
+    with np.load(path) as archive:
+        return {name: archive[name] for name in archive.files}
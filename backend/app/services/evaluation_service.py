@@ -1,44 +1,46 @@
 import os
-import uuid
+import math
+import time
+import random
 import zipfile
-import shutil
+from collections import Counter
+from statistics import NormalDist
+import numpy as np
 from fastapi import UploadFile
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 
+from app.core.config import settings
 from app.services.model_services import model_loader, ModelServiceError
-from app.services import audio_service
+from app.services import audio_service, dataset_service, feature_shard_service, sharded_evaluation_service, evaluation_run_service
+from app.services.scratch_service import scratch_manager
 
-EVALUATION_TEMP_DIR = "./temp_evaluation"
-os.makedirs(EVALUATION_TEMP_DIR, exist_ok=True)
+# Files decoded and featurized together before the model(s) run on them
+EVALUATION_BATCH_SIZE = 32
+SUPPORTED_AUDIO_FORMATS = dataset_service.SUPPORTED_AUDIO_FORMATS
 
 class EvaluationServiceError(Exception):
     """Custom exception for evaluation service errors."""
     pass
 
-async def run_evaluation(zip_file: UploadFile) -> dict:
+def run_evaluation(zip_file: UploadFile) -> dict:
     """
     Orchestrates the entire model evaluation process.
     """
     # 1. Get the currently loaded model and metadata
     try:
-        model, metadata = model_loader.get_current_model()
-        if metadata.class_labels:
-            model_class_labels = sorted(metadata.class_labels)
-        elif metadata.num_classes:
-            model_class_labels = [f"Class_{i}" for i in range(metadata.num_classes)]
-        else:
-            raise EvaluationServiceError("Cannot run evaluation: Model has no class labels or number of classes defined.")
+        model, metadata = model_loader.get_model()
+        model_filename = model_loader.get_model_filename()
     except ModelServiceError as e:
         raise EvaluationServiceError(str(e))
+    model_class_labels = _get_model_class_labels(metadata)
+    target_sr = metadata.sample_rate or audio_service.DEFAULT_SAMPLE_RATE
 
-    # 2. Unzip the uploaded dataset to a temporary location
-    eval_session_id = str(uuid.uuid4())
-    unzip_path = os.path.join(EVALUATION_TEMP_DIR, eval_session_id)
-    os.makedirs(unzip_path)
+    # 2. Unzip the uploaded dataset into a scratch lease (quota and free space are
+    #    checked against the uncompressed size before anything is written)
+    scratch = scratch_manager.lease("evaluation")
 
     try:
-        with zipfile.ZipFile(zip_file.file, 'r') as zf:
-            zf.extractall(unzip_path)
+        unzip_path = scratch.extract_zip(zip_file.file)
 
         # 3. Parse dataset and validate against model labels (REQ-004-1)
         filepaths, true_labels = _parse_dataset(unzip_path, model_class_labels)
@@ -46,60 +48,641 @@ async def run_evaluation(zip_file: UploadFile) -> dict:
         if not filepaths:
             raise EvaluationServiceError("Dataset is empty or has an invalid structure.")
 
-        # 4. Run prediction on each file
-        predicted_labels = []
-        for file_path in filepaths:
-            try:
-                result = audio_service.predict_audio_file(file_path)
-                predicted_labels.append(result["predicted_class"])
-            except audio_service.AudioServiceError:
-                # If a single file fails, we'll skip it for the report
-                # but a more robust implementation might log this.
-                continue
+        # 4. Run prediction on each file, in batches
+        file_ids = [os.path.relpath(path, unzip_path) for path in filepaths]
+        logit_batches = []
+        scored_file_ids = []
+        for start in range(0, len(filepaths), EVALUATION_BATCH_SIZE):
+            features = []
+            for file_path, file_id in zip(filepaths[start:start + EVALUATION_BATCH_SIZE], file_ids[start:start + EVALUATION_BATCH_SIZE]):
+                try:
+                    audio = audio_service.load_audio(file_path, target_sr, audio_service.WINDOW_SAMPLES)
+                    features.append(audio_service.compute_log_mel(audio, target_sr))
+                except Exception:
+                    # If a single file fails, we'll skip it for the report;
+                    # it is still recorded as failed in the run artifact.
+                    continue
+                scored_file_ids.append(file_id)
+            if features:
+                logit_batches.append(audio_service.run_model(model, np.stack(features)).numpy())
+
+        # 5. Calculate evaluation metrics (REQ-004-2), persist the logits and format the results
+        result, _ = _report_and_persist(logit_batches, scored_file_ids, file_ids, true_labels, metadata, model_class_labels, model_filename)
+        return result
+    finally:
+        # 7. Clean up the unzipped files
+        scratch.close()
+
+
+def run_model_comparison(zip_file: UploadFile, model_filenames: list) -> dict:
+    """
+    Evaluates several models on one dataset. Each file is decoded once and featurized
+    once per distinct model sample rate; every model then runs on the same feature
+    batches. Returns one evaluation report per model plus pairwise disagreement stats.
+    """
+    if len(model_filenames) < 2:
+        raise EvaluationServiceError("At least two models are required for a comparison.")
+    if len(set(model_filenames)) != len(model_filenames):
+        raise EvaluationServiceError("Each model may only appear once in a comparison.")
+
+    # 1. Load (or fetch from cache) every model without changing the active one
+    models = []
+    try:
+        for filename in model_filenames:
+            model_loader.load_model(filename, activate=False)
+            model, metadata = model_loader.get_cached_model(filename)
+            models.append({
+                "filename": filename,
+                "model": model,
+                "metadata": metadata,
+                "class_labels": _get_model_class_labels(metadata),
+                "sample_rate": metadata.sample_rate or audio_service.DEFAULT_SAMPLE_RATE,
+            })
+    except ModelServiceError as e:
+        raise EvaluationServiceError(str(e))
+    sample_rates = sorted({entry["sample_rate"] for entry in models})
+    # The lowest model rate needs the longest stretch of audio to fill its window
+    window_seconds = audio_service.WINDOW_SAMPLES / sample_rates[0] + audio_service.RESAMPLE_MARGIN_SECONDS
 
-        # 5. Calculate evaluation metrics (REQ-004-2)
-        accuracy = accuracy_score(true_labels, predicted_labels)
-        report = classification_report(true_labels, predicted_labels, labels=model_class_labels, output_dict=True)
-        matrix = confusion_matrix(true_labels, predicted_labels, labels=model_class_labels)
+    # 2. Unzip the uploaded dataset into a scratch lease
+    scratch = scratch_manager.lease("evaluation")
+
+    try:
+        unzip_path = scratch.extract_zip(zip_file.file)
 
-        # 6. Format and return the results
+        # 3. Parse once and make sure every model knows every dataset label
+        filepaths, true_labels = _parse_dataset(unzip_path, models[0]["class_labels"])
+        if not filepaths:
+            raise EvaluationServiceError("Dataset is empty or has an invalid structure.")
+        for entry in models[1:]:
+            unknown = set(true_labels) - set(entry["class_labels"])
+            if unknown:
+                raise EvaluationServiceError(f"Dataset folders {sorted(unknown)} do not match any of the class labels of '{entry['filename']}'.")
+
+        # 4. Decode/featurize each batch once, then run every model over it
+        file_ids = [os.path.relpath(path, unzip_path) for path in filepaths]
+        scored_file_ids = []
+        logit_batches = {entry["filename"]: [] for entry in models}
+        for start in range(0, len(filepaths), EVALUATION_BATCH_SIZE):
+            features_by_rate = {sr: [] for sr in sample_rates}
+            batch_file_ids = []
+            for file_path, file_id in zip(filepaths[start:start + EVALUATION_BATCH_SIZE], file_ids[start:start + EVALUATION_BATCH_SIZE]):
+                try:
+                    audio, native_sr = audio_service.decode_audio(file_path, window_seconds)
+                    file_features = {
+                        sr: audio_service.compute_log_mel(audio_service.resample_audio(audio, native_sr, sr), sr)
+                        for sr in sample_rates
+                    }
+                except Exception:
+                    # Skipped for every model, so all reports cover the same files
+                    continue
+                for sr, feature in file_features.items():
+                    features_by_rate[sr].append(feature)
+                batch_file_ids.append(file_id)
+
+            if not batch_file_ids:
+                continue
+            batches = {sr: np.stack(features) for sr, features in features_by_rate.items()}
+            for entry in models:
+                logits = audio_service.run_model(entry["model"], batches[entry["sample_rate"]])
+                logit_batches[entry["filename"]].append(logits.numpy())
+            scored_file_ids.extend(batch_file_ids)
+
+        # 5. Per-model reports (each persisted as its own run) and pairwise disagreement
+        results = []
+        predictions = {}
+        for entry in models:
+            evaluation, predictions[entry["filename"]] = _report_and_persist(
+                logit_batches[entry["filename"]], scored_file_ids, file_ids, true_labels,
+                entry["metadata"], entry["class_labels"], entry["filename"]
+            )
+            results.append({"model_filename": entry["filename"], "evaluation": evaluation})
+        label_by_id = dict(zip(file_ids, true_labels))
+        scored_true_labels = [label_by_id[file_id] for file_id in scored_file_ids]
         return {
-            "overall_accuracy": accuracy,
-            "classification_report": report,
-            "confusion_matrix": matrix.tolist(), # Convert numpy array to list
-            "dataset_statistics": {
-                "total_files": len(filepaths),
-                "files_per_class": {label: true_labels.count(label) for label in model_class_labels}
-            }
+            "results": results,
+            "pairwise_disagreement": _pairwise_disagreement(scored_true_labels, predictions, model_filenames),
         }
     finally:
-        # 7. Clean up the unzipped files
-        if os.path.exists(unzip_path):
-            shutil.rmtree(unzip_path)
+        scratch.close()
 
+def _report_and_persist(logit_batches: list, scored_file_ids: list, file_ids: list, true_labels: list,
+                        metadata, model_class_labels: list, model_filename: str) -> tuple[dict, list]:
+    """
+    Builds the evaluation report from per-batch logits and stores the run artifact.
+    file_ids/true_labels cover the whole dataset; scored_file_ids lists the files that
+    produced a row of logits, in order. Returns the report (including its run id) and
+    the predicted label of every scored file.
+    """
+    if not logit_batches:
+        raise EvaluationServiceError("None of the dataset files could be processed.")
+    logits = np.concatenate(logit_batches)
 
-def _parse_dataset(base_path: str, model_class_labels: list) -> tuple[list, list]:
+    label_by_id = dict(zip(file_ids, true_labels))
+    scored_true_labels = [label_by_id[file_id] for file_id in scored_file_ids]
+    output_labels = [audio_service.label_for_index(i, metadata.class_labels or []) for i in range(logits.shape[1])]
+    predicted_labels = [output_labels[i] for i in logits.argmax(axis=1)]
+
+    result = _build_evaluation_result(scored_true_labels, predicted_labels, model_class_labels, true_labels)
+
+    scored = set(scored_file_ids)
+    failed = [(file_id, label) for file_id, label in zip(file_ids, true_labels) if file_id not in scored]
+    try:
+        result["run_id"] = evaluation_run_service.save_run(
+            logits, scored_true_labels, scored_file_ids, output_labels, model_class_labels,
+            [file_id for file_id, _ in failed], [label for _, label in failed], model_filename
+        )
+    except evaluation_run_service.EvaluationRunError as e:
+        # The report is still worth returning; it just can't be re-scored later
+        print(f"[WARNING] Could not persist evaluation run: {e}")
+    return result, predicted_labels
+
+def _pairwise_disagreement(true_labels: list, predictions: dict, model_filenames: list) -> list:
+    """For every pair of models, how often they disagree and who is right when they do."""
+    truth = np.asarray(true_labels)
+    correct = {name: np.asarray(predictions[name]) == truth for name in model_filenames}
+    stats = []
+    for i, model_a in enumerate(model_filenames):
+        for model_b in model_filenames[i + 1:]:
+            disagreements = int((np.asarray(predictions[model_a]) != np.asarray(predictions[model_b])).sum())
+            stats.append({
+                "model_a": model_a,
+                "model_b": model_b,
+                "disagreements": disagreements,
+                "disagreement_rate": disagreements / len(true_labels) if true_labels else 0.0,
+                "only_a_correct": int((correct[model_a] & ~correct[model_b]).sum()),
+                "only_b_correct": int((correct[model_b] & ~correct[model_a]).sum()),
+                "both_correct": int((correct[model_a] & correct[model_b]).sum()),
+                "both_wrong": int((~correct[model_a] & ~correct[model_b]).sum()),
+            })
+    return stats
+
+def _get_model_class_labels(metadata) -> list:
+    """Returns the label set (in report order) that a model is evaluated against."""
+    if metadata.class_labels:
+        return sorted(metadata.class_labels)
+    elif metadata.num_classes:
+        return [f"Class_{i}" for i in range(metadata.num_classes)]
+    raise EvaluationServiceError("Cannot run evaluation: Model has no class labels or number of classes defined.")
+
+def _count_per_class(dataset_labels: list, model_class_labels: list) -> dict:
+    counts = Counter(dataset_labels)
+    return {label: counts.get(label, 0) for label in model_class_labels}
+
+def _build_evaluation_result(true_labels: list, predicted_labels: list, model_class_labels: list, dataset_labels: list) -> dict:
     """
-    Walks the unzipped directory, validates subfolders, and collects file paths and labels.
+    Calculates the evaluation metrics for aligned true/predicted labels. dataset_labels
+    holds the label of every file in the dataset, including any that failed to process.
+    """
+    if not predicted_labels:
+        raise EvaluationServiceError("None of the dataset files could be processed.")
+
+    accuracy = accuracy_score(true_labels, predicted_labels)
+    report = classification_report(true_labels, predicted_labels, labels=model_class_labels, output_dict=True, zero_division=0)
+    matrix = confusion_matrix(true_labels, predicted_labels, labels=model_class_labels)
+
+    return {
+        "overall_accuracy": accuracy,
+        "classification_report": report,
+        "confusion_matrix": matrix.tolist(), # Convert numpy array to list
+        "dataset_statistics": {
+            "total_files": len(dataset_labels),
+            "files_per_class": _count_per_class(dataset_labels, model_class_labels)
+        }
+    }
+
+def _build_result_from_confusion_matrix(matrix, model_class_labels: list, dataset_labels: list, unmatched=None) -> dict:
+    """
+    Same output as _build_evaluation_result, computed from an already merged confusion
+    matrix (rows are true labels, columns predictions, both in model_class_labels order).
+    unmatched counts, per true label, files predicted as a class outside model_class_labels;
+    like sklearn, they count as misses in accuracy and recall but fall in no column.
+    """
+    matrix = np.asarray(matrix, dtype=np.int64)
+    unmatched = np.zeros(len(model_class_labels), dtype=np.int64) if unmatched is None else np.asarray(unmatched, dtype=np.int64)
+    total = int(matrix.sum() + unmatched.sum())
+    if total == 0:
+        raise EvaluationServiceError("None of the dataset files could be processed.")
+
+    true_positives = np.diag(matrix).astype(np.float64)
+    support = matrix.sum(axis=1) + unmatched
+    predicted = matrix.sum(axis=0)
+    precision = np.divide(true_positives, predicted, out=np.zeros_like(true_positives), where=predicted > 0)
+    recall = np.divide(true_positives, support, out=np.zeros_like(true_positives), where=support > 0)
+    denominator = precision + recall
+    f1 = np.divide(2 * precision * recall, denominator, out=np.zeros_like(true_positives), where=denominator > 0)
+
+    def class_metrics(p, r, f, n):
+        return {"precision": float(p), "recall": float(r), "f1-score": float(f), "support": int(n)}
+
+    weights = support / total
+    report = {label: class_metrics(precision[i], recall[i], f1[i], support[i]) for i, label in enumerate(model_class_labels)}
+    report["accuracy"] = float(true_positives.sum() / total)
+    report["macro avg"] = class_metrics(precision.mean(), recall.mean(), f1.mean(), total)
+    report["weighted avg"] = class_metrics((precision * weights).sum(), (recall * weights).sum(), (f1 * weights).sum(), total)
+
+    return {
+        "overall_accuracy": report["accuracy"],
+        "classification_report": report,
+        "confusion_matrix": matrix.tolist(),
+        "dataset_statistics": {
+            "total_files": len(dataset_labels),
+            "files_per_class": _count_per_class(dataset_labels, model_class_labels)
+        }
+    }
+
+def evaluate_feature_shards(shard_dir: str) -> dict:
+    """
+    Evaluates the currently loaded model over a precomputed feature-shard dataset
+    (see feature_shard_service). No audio is decoded; only inference is run.
+    """
+    try:
+        model, metadata = model_loader.get_model()
+    except ModelServiceError as e:
+        raise EvaluationServiceError(str(e))
+    model_class_labels = _get_model_class_labels(metadata)
+
+    try:
+        index = feature_shard_service.load_index(shard_dir)
+        feature_shard_service.check_frontend_compatible(index, metadata)
+    except feature_shard_service.FeatureShardError as e:
+        raise EvaluationServiceError(str(e))
+
+    for label in index["class_labels"]:
+        if label not in model_class_labels:
+            raise EvaluationServiceError(f"Dataset folder '{label}' does not match any of the model's class labels.")
+
+    logit_batches = []
+    for batch, _ in feature_shard_service.iter_batches(shard_dir, index):
+        logit_batches.append(audio_service.run_model(model, batch).numpy())
+
+    entries = index["items"] + index["failed"]
+    result, _ = _report_and_persist(
+        logit_batches, [item["file_id"] for item in index["items"]],
+        [item["file_id"] for item in entries], [item["label"] for item in entries],
+        metadata, model_class_labels, model_loader.get_model_filename()
+    )
+    return result
+
+def rescore_evaluation_run(run_id: str, label_mapping: dict = None, class_subset: list = None,
+                           top_k: list = None, confidence_threshold: float = None,
+                           threshold_sweep: list = None) -> dict:
+    """
+    Recomputes evaluation metrics from the stored logits of a run, without inference.
+    - label_mapping renames/merges labels on both the true and the predicted side.
+    - class_subset keeps only files of those classes and only those logit columns.
+    - top_k lists the k values for top-k accuracy.
+    - confidence_threshold only scores files whose top softmax probability reaches it.
+    - threshold_sweep reports coverage and accuracy at each given threshold.
     """
-    filepaths = []
-    true_labels = []
-    supported_formats = (".wav", ".mp3", ".m4a", ".flac")
+    try:
+        run = evaluation_run_service.load_run(run_id)
+    except evaluation_run_service.EvaluationRunError as e:
+        raise EvaluationServiceError(str(e))
+
+    logits = run["logits"]
+    true_labels = run["true_labels"]
+    output_labels = run["class_labels"]
+    report_labels = list(run["report_labels"])
+    dataset_labels = np.concatenate([true_labels, run["failed_labels"]])
+
+    if class_subset:
+        unknown = set(class_subset) - set(output_labels)
+        if unknown:
+            raise EvaluationServiceError(f"Classes {sorted(unknown)} are not outputs of the evaluated model.")
+        columns = np.isin(output_labels, class_subset)
+        rows = np.isin(true_labels, class_subset)
+        logits = logits[rows][:, columns]
+        true_labels = true_labels[rows]
+        output_labels = output_labels[columns]
+        report_labels = [label for label in report_labels if label in class_subset]
+        dataset_labels = dataset_labels[np.isin(dataset_labels, class_subset)]
+
+    if label_mapping:
+        def remap(labels):
+            return np.array([label_mapping.get(label, label) for label in labels], dtype=str)
+        output_labels = remap(output_labels)
+        true_labels = remap(true_labels)
+        dataset_labels = remap(dataset_labels)
+        report_labels = sorted(set(label_mapping.get(label, label) for label in report_labels))
+
+    if logits.shape[0] == 0 or logits.shape[1] == 0:
+        raise EvaluationServiceError("No files left to score after applying the class subset.")
+
+    # Numerically stable softmax
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    probabilities = np.exp(shifted)
+    probabilities /= probabilities.sum(axis=1, keepdims=True)
+    confidence = probabilities.max(axis=1)
+    ranking = np.argsort(-probabilities, axis=1, kind="stable")
+    predicted_labels = output_labels[ranking[:, 0]]
+    correct = predicted_labels == true_labels
+
+    top_k_accuracy = {}
+    for k in sorted(set(top_k or [1])):
+        hits = (output_labels[ranking[:, :k]] == true_labels[:, np.newaxis]).any(axis=1)
+        top_k_accuracy[str(k)] = float(hits.mean())
 
-    dataset_folders = [d for d in os.listdir(base_path) if os.path.isdir(os.path.join(base_path, d))]
+    selected = confidence >= confidence_threshold if confidence_threshold is not None else np.ones(len(confidence), dtype=bool)
 
-    # REQ-004-1: Validate that folder names match model class labels
-    for folder in dataset_folders:
-        if folder not in model_class_labels:
-            raise EvaluationServiceError(f"Dataset folder '{folder}' does not match any of the model's class labels.")
+    # Confusion matrix over the report labels via bincount. Predictions outside the
+    # report labels (unmapped model outputs) fall in no column but, as in /run, still
+    # count as misses for their true label, so they are tallied separately
+    label_index = {label: i for i, label in enumerate(report_labels)}
+    true_index = np.array([label_index.get(label, -1) for label in true_labels])
+    predicted_index = np.array([label_index.get(label, -1) for label in predicted_labels])
+    scored = selected & (true_index >= 0)
+    keep = scored & (predicted_index >= 0)
+    num_labels = len(report_labels)
+    matrix = np.bincount(
+        true_index[keep] * num_labels + predicted_index[keep], minlength=num_labels * num_labels
+    ).reshape(num_labels, num_labels)
+    unmatched = np.bincount(true_index[scored & (predicted_index < 0)], minlength=num_labels)
 
-    for root, _, files in os.walk(base_path):
-        for file in files:
-            if file.lower().endswith(supported_formats):
-                class_label = os.path.basename(root)
-                if class_label in model_class_labels:
-                    filepaths.append(os.path.join(root, file))
-                    true_labels.append(class_label)
-    
-    return filepaths, true_labels
+    result = _build_result_from_confusion_matrix(matrix, report_labels, dataset_labels.tolist(), unmatched)
+    result.update({
+        "run_id": run_id,
+        "coverage": float(selected.mean()),
+        "top_k_accuracy": top_k_accuracy,
+        "threshold_sweep": [
+            {
+                "threshold": float(threshold),
+                "coverage": float((confidence >= threshold).mean()),
+                "accuracy": float(correct[confidence >= threshold].mean()) if (confidence >= threshold).any() else None,
+            }
+            for threshold in (threshold_sweep or [])
+        ],
+    })
+    return result
+
+def run_approximate_evaluation(zip_file: UploadFile, target_ci_width: float = 0.05, confidence_level: float = 0.95,
+                                     time_budget_seconds: float = 30.0, files_per_class_per_round: int = 16,
+                                     seed: int = None) -> dict:
+    """
+    Estimates accuracy and per-class recall from a stratified random sample of the
+    dataset instead of scoring every file. Each round draws up to
+    files_per_class_per_round unseen files from every class folder; only those members
+    are extracted from the zip. After each round the estimates get confidence intervals,
+    and sampling stops once every interval is narrower than target_ci_width, the time
+    budget is spent, or the dataset is exhausted. The budget is checked after every
+    batch, so a large round is cut short and estimated from what was scored so far.
+    """
+    if not 0 < confidence_level < 1:
+        raise EvaluationServiceError("confidence_level must be between 0 and 1.")
+    if files_per_class_per_round < 1:
+        raise EvaluationServiceError("files_per_class_per_round must be at least 1.")
+
+    try:
+        model, metadata = model_loader.get_model()
+    except ModelServiceError as e:
+        raise EvaluationServiceError(str(e))
+    model_class_labels = _get_model_class_labels(metadata)
+    target_sr = metadata.sample_rate or audio_service.DEFAULT_SAMPLE_RATE
+    output_labels = metadata.class_labels or []
+    z = NormalDist().inv_cdf(0.5 + confidence_level / 2)
 
+    start = time.perf_counter()
+    scratch = scratch_manager.lease("evaluation")
+    try:
+        with zipfile.ZipFile(zip_file.file, 'r') as zf:
+            members_by_class = _parse_zip_members(zf, model_class_labels)
+            if not any(members_by_class.values()):
+                raise EvaluationServiceError("Dataset is empty or has an invalid structure.")
+
+            rng = random.Random(seed)
+            for members in members_by_class.values():
+                rng.shuffle(members)
+            population = {label: len(members) for label, members in members_by_class.items()}
+            label_index = {label: i for i, label in enumerate(model_class_labels)}
+            matrix = np.zeros((len(model_class_labels), len(model_class_labels)), dtype=np.int64)
+            failed = Counter()
+            unmatched = Counter()
+            drawn = Counter()
+            rounds = []
+            stopped_reason = "exhausted"
+
+            while True:
+                # 1. Draw the next stratum samples, interleaved across classes so a round
+                #    cut short by the time budget still covers every class evenly
+                draws = []
+                for label, members in members_by_class.items():
+                    take = members[drawn[label]:drawn[label] + files_per_class_per_round]
+                    drawn[label] += len(take)
+                    draws.append([(info, label) for info in take])
+                sample = [draw[position] for position in range(files_per_class_per_round)
+                          for draw in draws if position < len(draw)]
+                if not sample:
+                    break
+
+                # 2. Extract, featurize and score only the sampled members
+                out_of_time = False
+                for batch_start in range(0, len(sample), EVALUATION_BATCH_SIZE):
+                    if time.perf_counter() - start >= time_budget_seconds:
+                        out_of_time = True
+                        break
+                    features, labels = [], []
+                    for info, label in sample[batch_start:batch_start + EVALUATION_BATCH_SIZE]:
+                        try:
+                            with zf.open(info) as member:
+                                temp_file_path = scratch.save_stream(member, info.filename)
+                            try:
+                                audio = audio_service.load_audio(temp_file_path, target_sr, audio_service.WINDOW_SAMPLES)
+                                features.append(audio_service.compute_log_mel(audio, target_sr))
+                                labels.append(label)
+                            finally:
+                                scratch.remove(temp_file_path)
+                        except Exception:
+                            failed[label] += 1
+                    if not features:
+                        continue
+                    logits = audio_service.run_model(model, np.stack(features)).numpy()
+                    for label, predicted in zip(labels, logits.argmax(axis=1)):
+                        predicted_label = audio_service.label_for_index(int(predicted), output_labels)
+                        if predicted_label in label_index:
+                            matrix[label_index[label], label_index[predicted_label]] += 1
+                        else:
+                            # Outputs without a dataset label can't enter the matrix but still count as misses
+                            unmatched[label] += 1
+
+                # 3. Estimate with confidence intervals
+                estimate = _approximate_estimate(matrix, unmatched, model_class_labels, population, failed, z)
+                files_scored = int(matrix.sum()) + sum(unmatched.values())
+                elapsed = time.perf_counter() - start
+                rounds.append({
+                    "round": len(rounds) + 1,
+                    "files_scored": files_scored,
+                    "elapsed_seconds": round(elapsed, 3),
+                    "accuracy": estimate["accuracy"],
+                    "accuracy_ci": estimate["accuracy_ci"],
+                    "max_ci_width": estimate["max_ci_width"],
+                    "per_class": estimate["per_class"],
+                })
+                print(f"[APPROX EVAL] Round {len(rounds)}: {files_scored} files, accuracy {estimate['accuracy']:.3f} "
+                      f"[{estimate['accuracy_ci'][0]:.3f}, {estimate['accuracy_ci'][1]:.3f}], max CI width {estimate['max_ci_width']:.3f}")
+
+                if estimate["max_ci_width"] <= target_ci_width:
+                    stopped_reason = "converged"
+                    break
+                if out_of_time or elapsed >= time_budget_seconds:
+                    stopped_reason = "time_budget"
+                    break
+    except zipfile.BadZipFile as e:
+        raise EvaluationServiceError(f"Invalid zip file: {e}")
+    finally:
+        scratch.close()
+
+    if not rounds or files_scored == 0:
+        raise EvaluationServiceError("None of the sampled dataset files could be processed.")
+
+    return {
+        "overall_accuracy": estimate["accuracy"],
+        "accuracy_ci": estimate["accuracy_ci"],
+        "confidence_level": confidence_level,
+        "per_class": estimate["per_class"],
+        "confusion_matrix": matrix.tolist(),
+        "files_scored": files_scored,
+        "total_files": sum(population.values()),
+        "stopped_reason": stopped_reason,
+        "rounds": rounds,
+    }
+
+def _parse_zip_members(zf: zipfile.ZipFile, model_class_labels: list) -> dict:
+    """
+    The zip-listing counterpart of _parse_dataset: same validation and labelling rules,
+    but returns ZipInfo members per class without extracting anything.
+    """
+    members_by_class = {label: [] for label in model_class_labels}
+    for info in zf.infolist():
+        parts = [part for part in info.filename.split("/") if part]
+        if len(parts) > 1 and parts[0] not in model_class_labels:
+            raise EvaluationServiceError(f"Dataset folder '{parts[0]}' does not match any of the model's class labels.")
+        if info.is_dir() or not info.filename.lower().endswith(SUPPORTED_AUDIO_FORMATS):
+            continue
+        if len(parts) > 1 and parts[-2] in members_by_class:
+            members_by_class[parts[-2]].append(info)
+    return {label: members for label, members in members_by_class.items() if members}
+
+def _wilson_interval(successes: int, n: int, z: float, population: int) -> tuple:
+    """
+    Wilson score interval for a proportion, narrowed by the finite population
+    correction; a fully sampled stratum has an exact (zero-width) interval.
+    """
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    if n >= population:
+        return p, p
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    if population > 1:
+        half_width *= math.sqrt((population - n) / (population - 1))
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+def _approximate_estimate(matrix: np.ndarray, unmatched: Counter, model_class_labels: list, population: dict,
+                          failed: Counter, z: float) -> dict:
+    """
+    Per-class recall with Wilson intervals, and the stratified accuracy estimate
+    sum_c (N_c / N) * recall_c with a normal-approximation interval.
+    """
+    total_population = sum(population.values())
+    per_class = {}
+    accuracy = 0.0
+    variance = 0.0
+    widths = []
+    for i, label in enumerate(model_class_labels):
+        if label not in population:
+            continue
+        n = int(matrix[i].sum()) + unmatched[label]
+        correct = int(matrix[i, i])
+        # Files that failed to decode can never be scored, so they leave the stratum
+        stratum_size = max(population[label] - failed[label], n)
+        low, high = _wilson_interval(correct, n, z, stratum_size)
+        recall = correct / n if n else 0.0
+        per_class[label] = {
+            "recall": recall, "ci_low": low, "ci_high": high,
+            "sampled": n, "population": population[label], "failed": failed[label],
+        }
+        widths.append(high - low)
+
+        weight = population[label] / total_population
+        accuracy += weight * recall
+        if n == 0:
+            variance += weight * weight * 0.25
+        elif n < stratum_size:
+            # Agresti-Coull adjusted proportion keeps early all-correct/all-wrong strata from looking certain
+            adjusted = (correct + z * z / 2) / (n + z * z)
+            fpc = (stratum_size - n) / max(stratum_size - 1, 1)
+            variance += weight * weight * adjusted * (1 - adjusted) / n * fpc
+
+    half_width = z * math.sqrt(variance)
+    accuracy_ci = [max(0.0, accuracy - half_width), min(1.0, accuracy + half_width)]
+    widths.append(accuracy_ci[1] - accuracy_ci[0])
+    return {
+        "accuracy": accuracy,
+        "accuracy_ci": accuracy_ci,
+        "per_class": per_class,
+        "max_ci_width": max(widths),
+    }
+
+def resolve_dataset_path(dataset_path: str) -> str:
+    """
+    Resolves a client-supplied dataset path against EVALUATION_DATASET_ROOT. Paths that
+    end up outside the root (absolute paths, '..', symlinks) are refused, so clients
+    can't make the server walk and decode arbitrary directories.
+    """
+    root = os.path.realpath(settings.EVALUATION_DATASET_ROOT)
+    resolved = os.path.realpath(os.path.join(root, dataset_path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise EvaluationServiceError("Dataset path must be inside the configured dataset root.")
+    if not os.path.isdir(resolved):
+        raise EvaluationServiceError(f"Dataset directory not found: {dataset_path}")
+    return resolved
+
+def run_sharded_evaluation(dataset_path: str, model_filename: str = None, num_workers: int = 0,
+                           shard_size: int = 0, resume: bool = True) -> dict:
+    """
+    Evaluates a dataset directory below EVALUATION_DATASET_ROOT across a pool of worker
+    processes, checkpointing each finished shard so an interrupted run can be resumed.
+    """
+    dataset_path = resolve_dataset_path(dataset_path)
+
+    try:
+        if model_filename:
+            model_loader.load_model(model_filename, activate=False)
+            _, metadata = model_loader.get_cached_model(model_filename)
+        else:
+            model_filename = model_loader.get_model_filename()
+            _, metadata = model_loader.get_model()
+    except ModelServiceError as e:
+        raise EvaluationServiceError(str(e))
+    model_class_labels = _get_model_class_labels(metadata)
+
+    filepaths, true_labels = _parse_dataset(dataset_path, model_class_labels)
+    if not filepaths:
+        raise EvaluationServiceError("Dataset is empty or has an invalid structure.")
+
+    try:
+        run = sharded_evaluation_service.run_sharded_evaluation(
+            filepaths, true_labels, model_filename, model_class_labels, num_workers, shard_size, resume
+        )
+    except sharded_evaluation_service.ShardedEvaluationError as e:
+        raise EvaluationServiceError(str(e))
+
+    result = _build_result_from_confusion_matrix(run["confusion_matrix"], model_class_labels, true_labels, run["unmatched"])
+    result.update({
+        "checkpoint_id": run["run_id"],
+        "shards_total": run["shards_total"],
+        "shards_resumed": run["shards_resumed"],
+        "failed_files": run["failed_files"],
+    })
+    return result
+
+def _parse_dataset(base_path: str, model_class_labels: list) -> tuple[list, list]:
+    """
+    Walks the unzipped directory, validates subfolders, and collects file paths and labels.
+    """
+    try:
+        return dataset_service.parse_dataset(base_path, model_class_labels)
+    except dataset_service.DatasetError as e:
+        raise EvaluationServiceError(str(e))
@@ -0,0 +1,138 @@
+import os
+import json
+import numpy as np
+
+from app.services import audio_service
+
+# On-disk layout of a feature-shard dataset:
+#   <shard_dir>/index.json         file ids, labels, shard locations and front-end parameters
+#   <shard_dir>/shard_00000.npy    float32 log-mels shaped (rows, N_MELS, TARGET_WIDTH)
+INDEX_FILENAME = "index.json"
+SHARD_FORMAT_VERSION = 1
+DEFAULT_SHARD_SIZE = 512
+DEFAULT_BATCH_SIZE = 64
+
+class FeatureShardError(Exception):
+    """Custom exception for feature-shard errors."""
+    pass
+
+def frontend_parameters(sample_rate: int) -> dict:
+    """The front-end parameters the shards were computed with, stored in the index."""
+    return {
+        "sample_rate": sample_rate,
+        "n_mels": audio_service.N_MELS,
+        "n_fft": audio_service.N_FFT,
+        "hop_length": audio_service.HOP_LENGTH,
+        "target_width": audio_service.TARGET_WIDTH,
+    }
+
+def _shard_filename(shard_number: int) -> str:
+    return f"shard_{shard_number:05d}.npy"
+
+def _write_shard(out_dir: str, shard_number: int, features: list) -> str:
+    """Writes one shard as a memory-mappable .npy file."""
+    filename = _shard_filename(shard_number)
+    shard = np.lib.format.open_memmap(
+        os.path.join(out_dir, filename), mode="w+", dtype=np.float32,
+        shape=(len(features), audio_service.N_MELS, audio_service.TARGET_WIDTH)
+    )
+    for row, feature in enumerate(features):
+        shard[row] = feature
+    shard.flush()
+    del shard
+    return filename
+
+def build_shards(filepaths: list, labels: list, file_ids: list, out_dir: str,
+                 sample_rate: int = audio_service.DEFAULT_SAMPLE_RATE,
+                 shard_size: int = DEFAULT_SHARD_SIZE) -> dict:
+    """
+    Decodes and featurizes every file once and writes the log-mels into shards of at most
+    shard_size rows. Files that fail to decode are recorded in the index under 'failed'.
+    Returns the index.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    index = {
+        "version": SHARD_FORMAT_VERSION,
+        "frontend": frontend_parameters(sample_rate),
+        "class_labels": sorted(set(labels)),
+        "shards": [],
+        "items": [],
+        "failed": [],
+    }
+
+    pending_features = []
+    pending_items = []
+
+    def flush_pending():
+        shard_number = len(index["shards"])
+        filename = _write_shard(out_dir, shard_number, pending_features)
+        index["shards"].append({"file": filename, "count": len(pending_features)})
+        for row, item in enumerate(pending_items):
+            item.update({"shard": shard_number, "row": row})
+            index["items"].append(item)
+        pending_features.clear()
+        pending_items.clear()
+
+    for i, (file_path, label, file_id) in enumerate(zip(filepaths, labels, file_ids)):
+        try:
+            audio = audio_service.load_audio(file_path, sample_rate, audio_service.WINDOW_SAMPLES)
+            pending_features.append(audio_service.compute_log_mel(audio, sample_rate))
+            pending_items.append({"file_id": file_id, "label": label})
+        except Exception as e:
+            print(f"  - FAILED to featurize '{file_id}'. Error: {e}")
+            index["failed"].append({"file_id": file_id, "label": label, "error": str(e)})
+            continue
+
+        if len(pending_features) >= shard_size:
+            flush_pending()
+        if (i + 1) % 100 == 0:
+            print(f"Featurized {i + 1}/{len(filepaths)} files")
+
+    if pending_features:
+        flush_pending()
+
+    with open(os.path.join(out_dir, INDEX_FILENAME), "w") as f:
+        json.dump(index, f)
+    return index
+
+def load_index(shard_dir: str) -> dict:
+    """Reads and validates the index of a feature-shard dataset."""
+    index_path = os.path.join(shard_dir, INDEX_FILENAME)
+    if not os.path.exists(index_path):
+        raise FeatureShardError(f"No feature-shard index found in '{shard_dir}'.")
+    with open(index_path) as f:
+        index = json.load(f)
+    if index.get("version") != SHARD_FORMAT_VERSION:
+        raise FeatureShardError(f"Unsupported feature-shard format version: {index.get('version')}")
+    return index
+
+def check_frontend_compatible(index: dict, metadata) -> None:
+    """Ensures the shards were computed with the front-end the model expects."""
+    expected = frontend_parameters(metadata.sample_rate or audio_service.DEFAULT_SAMPLE_RATE)
+    if index["frontend"] != expected:
+        raise FeatureShardError(
+            f"Feature shards were computed with {index['frontend']}, but the model expects {expected}."
+        )
+
+def open_shard(shard_dir: str, shard_info: dict) -> np.ndarray:
+    """
+    Memory-maps a shard. Copy-on-write mode keeps the array writable for torch.from_numpy
+    without ever copying the file contents.
+    """
+    return np.load(os.path.join(shard_dir, shard_info["file"]), mmap_mode="c")
+
+def iter_batches(shard_dir: str, index: dict, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Yields (features, labels) batches in index order. Each features array is a slice
+    (a view) of a memory-mapped shard, so batching doesn't copy.
+    """
+    labels_by_shard = [[] for _ in index["shards"]]
+    for item in index["items"]:
+        labels_by_shard[item["shard"]].append(item["label"])
+
+    for shard_number, shard_info in enumerate(index["shards"]):
+        shard = open_shard(shard_dir, shard_info)
+        shard_labels = labels_by_shard[shard_number]
+        for start in range(0, shard_info["count"], batch_size):
+            yield shard[start:start + batch_size], shard_labels[start:start + batch_size]
+        del shard
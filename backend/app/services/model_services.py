@@ -1,10 +1,14 @@
 import torch
 import os
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from app.core.config import settings
 from app.models.model_schemas import ModelMetadata
 from app.models.torch_model import SimpleCNN
+from app.services.scratch_service import scratch_manager
 
-UPLOAD_DIRECTORY = "./temp_uploads"
+UPLOAD_DIRECTORY = scratch_manager.root("models").path
 
 class ModelServiceError(Exception):
     """Custom exception for model service errors."""
@@ -12,22 +16,42 @@ class ModelServiceError(Exception):
 
 class ModelLoaderSingleton:
     _instance = None
-    _model = None
-    _metadata = None
+    # (model, metadata, filename) of the current model, or None. Always replaced as a
+    # whole, so a request never pairs one model's weights with another's labels, even
+    # while the shared-model watcher thread switches models.
+    _active = None
+    _cache_lock = threading.Lock()
+    # filename -> (file mtime, model, metadata), least recently used first, so switching
+    # back to a preloaded model doesn't hit the disk again. Preloaded models (unless
+    # models are shared across workers) and the active one always stay; at most
+    # MODEL_CACHE_SIZE others are kept besides them.
+    _cache = OrderedDict()
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(ModelLoaderSingleton, cls).__new__(cls)
         return cls._instance
 
-    def load_model(self, filename: str) -> ModelMetadata:
+    def load_model(self, filename: str, activate: bool = True) -> ModelMetadata:
         """
         Loads a model and stores it internally within the singleton instance.
+        With activate=False the model is only cached, leaving the current model in place.
         """
         file_path = os.path.join(UPLOAD_DIRECTORY, filename)
         if not os.path.exists(file_path):
             raise ModelServiceError(f"Model file not found: {filename}")
 
+        mtime = os.path.getmtime(file_path)
+        cached = self._cache.get(filename)
+        if cached is not None and cached[0] == mtime:
+            _, model, metadata = cached
+            with self._cache_lock:
+                if filename in self._cache:
+                    self._cache.move_to_end(filename)
+            if activate:
+                self._active = (model, metadata, filename)
+            return metadata
+
         try:
             print("\n[DEBUG] Attempting to load model file with Singleton...\n")
             loaded_file = torch.load(file_path, map_location=torch.device('cpu'))
@@ -77,21 +101,62 @@ class ModelLoaderSingleton:
                 confidence_level=confidence
             )
 
-            self._model = model
-            self._metadata = metadata
+            if activate:
+                self._active = (model, metadata, filename)
+            self._store(filename, (mtime, model, metadata))
             
             return metadata
 
         except Exception as e:
-            self._model = None
-            self._metadata = None
+            with self._cache_lock:
+                self._cache.pop(filename, None)
+            if activate:
+                self._active = None
             raise ModelServiceError(f"Failed to load or inspect the model: {e}")
 
+    def activate_model(self, filename: str, model, metadata: ModelMetadata, mtime: float = None) -> None:
+        """
+        Makes an already built model the current one, e.g. one attached to shared weights.
+        With the file's mtime it also replaces the cache entry, dropping any private copy.
+        """
+        self._active = (model, metadata, filename)
+        if mtime is not None:
+            self._store(filename, (mtime, model, metadata))
+
+    def _store(self, filename: str, entry: tuple) -> None:
+        """Caches a model as most recently used and evicts the oldest unpinned entries over the limit."""
+        active = self._active
+        # With shared models preloads are only publication seeds, so just the active model stays
+        preloads = set() if settings.SHARED_MODELS_ENABLED else set(settings.PRELOAD_MODELS)
+        pinned = preloads | ({active[2]} if active else set())
+        with self._cache_lock:
+            self._cache[filename] = entry
+            self._cache.move_to_end(filename)
+            evictable = [name for name in self._cache if name not in pinned and name != filename]
+            while evictable and len(self._cache) - len(pinned & self._cache.keys()) > settings.MODEL_CACHE_SIZE:
+                del self._cache[evictable.pop(0)]
+
     def get_model(self):
         """Returns the currently loaded model and its metadata from the instance."""
-        if self._model is None or self._metadata is None:
+        active = self._active
+        if active is None:
+            raise ModelServiceError("No model is currently loaded. Please load a model first.")
+        return active[0], active[1]
+
+    def get_model_filename(self) -> str:
+        """Returns the filename (inside temp_uploads) of the currently loaded model."""
+        active = self._active
+        if active is None:
             raise ModelServiceError("No model is currently loaded. Please load a model first.")
-        return self._model, self._metadata
+        return active[2]
+
+    def get_cached_model(self, filename: str):
+        """Returns a previously loaded model and its metadata without activating it."""
+        cached = self._cache.get(filename)
+        if cached is None:
+            raise ModelServiceError(f"Model '{filename}' has not been loaded.")
+        _, model, metadata = cached
+        return model, metadata
 
 # Create the single, importable instance of the loader
 model_loader = ModelLoaderSingleton()
\ No newline at end of file
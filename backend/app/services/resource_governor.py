@@ -0,0 +1,133 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+import torch
+
+from app.core.config import settings
+
+class Overloaded(Exception):
+    """Raised when work cannot be admitted; surfaced to clients as 503 with Retry-After."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class _Gate:
+    """
+    Caps how many holders run at once. Up to queue_size callers may wait, each for at
+    most timeout seconds; anyone beyond that is rejected immediately. queue_size=None
+    and timeout=None make a plain blocking semaphore that never rejects.
+    """
+
+    def __init__(self, name: str, capacity: int, queue_size: int = None, timeout: float = None):
+        self.name = name
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._semaphore = threading.BoundedSemaphore(capacity)
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.max_wait_seconds = 0.0
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self.queue_size is not None and self.waiting >= self.queue_size and self.in_flight >= self.capacity:
+                self.rejected_queue_full += 1
+                raise Overloaded(f"Server is busy: the {self.name} queue is full.", settings.RETRY_AFTER_SECONDS)
+            self.waiting += 1
+
+        start = time.perf_counter()
+        acquired = self._semaphore.acquire(timeout=self.timeout) if self.timeout is not None else self._semaphore.acquire()
+        waited = time.perf_counter() - start
+
+        with self._lock:
+            self.waiting -= 1
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            if not acquired:
+                self.rejected_timeout += 1
+                raise Overloaded(f"Server is busy: no {self.name} slot freed up within {self.timeout}s.", settings.RETRY_AFTER_SECONDS)
+            self.in_flight += 1
+            self.admitted += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "admitted": self.admitted,
+                "rejected_queue_full": self.rejected_queue_full,
+                "rejected_timeout": self.rejected_timeout,
+                "max_wait_seconds": round(self.max_wait_seconds, 3),
+            }
+
+class ResourceGovernor:
+    """
+    Divides the CPU core budget between torch intra-op threads and request concurrency.
+
+    Requests are admitted per class ('predict', 'evaluation') through gates with a
+    bounded queue and bounded wait. Inside a request, model forwards and audio decodes
+    take blocking 'inference'/'decode' slots, so evaluations and live predictions share
+    the same caps instead of oversubscribing the CPU.
+    """
+
+    def __init__(self):
+        self.core_budget = settings.CPU_CORE_BUDGET or os.cpu_count() or 1
+        self.inference_concurrency = max(1, min(settings.INFERENCE_CONCURRENCY, self.core_budget))
+        self.torch_threads = max(1, self.core_budget // self.inference_concurrency)
+        decode_concurrency = settings.DECODE_CONCURRENCY or self.core_budget
+
+        self.gates = {
+            "predict": _Gate("predict", self.inference_concurrency, settings.ADMISSION_QUEUE_SIZE, settings.ADMISSION_TIMEOUT_SECONDS),
+            "evaluation": _Gate("evaluation", max(1, settings.EVALUATION_CONCURRENCY), settings.ADMISSION_QUEUE_SIZE, settings.ADMISSION_TIMEOUT_SECONDS),
+            "inference": _Gate("inference", self.inference_concurrency),
+            "decode": _Gate("decode", decode_concurrency),
+        }
+
+    def configure_torch(self) -> None:
+        """Applies the per-inference thread count; called once at server startup."""
+        torch.set_num_threads(self.torch_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Can only be set before torch's inter-op pool has started
+            pass
+        print(f"[GOVERNOR] Core budget {self.core_budget}: {self.inference_concurrency} concurrent inferences x {self.torch_threads} torch threads.")
+
+    def slot(self, kind: str):
+        return self.gates[kind].slot()
+
+    def admission(self, kind: str):
+        """A FastAPI dependency that holds a request slot of the given class for the request."""
+        def dependency():
+            with self.gates[kind].slot():
+                yield
+        return dependency
+
+    def stats(self) -> dict:
+        return {
+            "core_budget": self.core_budget,
+            "torch_threads_per_inference": self.torch_threads,
+            "gates": {name: gate.stats() for name, gate in self.gates.items()},
+        }
+
+# Create the single, importable instance of the governor
+governor = ResourceGovernor()
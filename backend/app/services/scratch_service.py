@@ -0,0 +1,269 @@
+import os
+import time
+import uuid
+import shutil
+import zipfile
+import threading
+
+from app.core.config import settings
+
+MB = 1024 * 1024
+COPY_CHUNK_SIZE = 1 * MB
+# Written into every lease directory with the owning pid. Workers on a node share the
+# scratch roots, so the janitor checks this rather than its own process's leases.
+LEASE_MARKER_FILENAME = ".lease"
+
+class ScratchError(Exception):
+    """Custom exception for scratch-space errors."""
+    pass
+
+class ScratchSpaceExhausted(ScratchError):
+    """Raised when a write would exceed a request's quota or the free-space reserve."""
+    pass
+
+class ScratchRoot:
+    """
+    One scratch directory. Entries older than max_age_seconds that no live lease is
+    using are removed by the janitor; roots with max_age_seconds=None are never swept.
+    The directory is created on first use, so importing the services has no side effects.
+    """
+
+    def __init__(self, name: str, path: str, max_age_seconds: int = None):
+        self.name = name
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+
+    def ensure(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+
+    def admit(self, nbytes: int) -> None:
+        """Refuses a write of nbytes if it would eat into the configured free-space reserve."""
+        self.ensure()
+        free = shutil.disk_usage(self.path).free
+        if free - nbytes < settings.SCRATCH_MIN_FREE_MB * MB:
+            scratch_manager.stats["admission_rejections"] += 1
+            raise ScratchSpaceExhausted(
+                f"Not enough free space in '{self.name}' scratch: {nbytes / MB:.1f} MB requested, "
+                f"{free / MB:.1f} MB free, {settings.SCRATCH_MIN_FREE_MB} MB must stay free."
+            )
+
+    def usage(self) -> dict:
+        self.ensure()
+        used_bytes = 0
+        entries = 0
+        for entry in os.scandir(self.path):
+            entries += 1
+            used_bytes += _entry_size(entry.path)
+        disk = shutil.disk_usage(self.path)
+        return {
+            "path": os.path.abspath(self.path),
+            "entries": entries,
+            "used_bytes": used_bytes,
+            "free_bytes": disk.free,
+            "total_bytes": disk.total,
+        }
+
+class ScratchLease:
+    """
+    A private directory inside a scratch root for the lifetime of one request. Every
+    write is charged against the request quota and admitted against free space; the
+    directory is deleted when the lease ends.
+    """
+
+    def __init__(self, root: ScratchRoot, quota_bytes: int):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.used_bytes = 0
+        self.path = os.path.join(root.path, uuid.uuid4().hex)
+        os.makedirs(self.path)
+        with open(os.path.join(self.path, LEASE_MARKER_FILENAME), "w") as f:
+            f.write(str(os.getpid()))
+
+    def reserve(self, nbytes: int) -> None:
+        if self.used_bytes + nbytes > self.quota_bytes:
+            scratch_manager.stats["quota_rejections"] += 1
+            raise ScratchSpaceExhausted(
+                f"Request exceeds its scratch quota of {self.quota_bytes / MB:.0f} MB."
+            )
+        self.root.admit(nbytes)
+        self.used_bytes += nbytes
+
+    def release(self, nbytes: int) -> None:
+        self.used_bytes = max(0, self.used_bytes - nbytes)
+
+    def file_path(self, filename: str) -> str:
+        """A path for a file inside the lease; only the base name of filename is used."""
+        return os.path.join(self.path, os.path.basename(filename) or uuid.uuid4().hex)
+
+    def save_stream(self, source, filename: str) -> str:
+        """Streams a file object into the lease, charging the quota chunk by chunk."""
+        file_path = self.file_path(filename)
+        with open(file_path, "wb") as buffer:
+            while True:
+                chunk = source.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.reserve(len(chunk))
+                buffer.write(chunk)
+        return file_path
+
+    def remove(self, file_path: str) -> None:
+        """Deletes a file written into the lease and gives its bytes back to the quota."""
+        if os.path.exists(file_path):
+            size = os.path.getsize(file_path)
+            os.remove(file_path)
+            self.release(size)
+
+    def extract_zip(self, source) -> str:
+        """
+        Extracts a zip into the lease after checking its total uncompressed size against
+        the quota and free space, so an oversized archive is refused before any write.
+        """
+        with zipfile.ZipFile(source, 'r') as zf:
+            self.reserve(sum(info.file_size for info in zf.infolist()))
+            zf.extractall(self.path)
+        return self.path
+
+    def close(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+        scratch_manager._release_lease(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def _lease_owner_alive(path: str) -> bool:
+    """True if path is a lease directory whose owning process is still running."""
+    try:
+        with open(os.path.join(path, LEASE_MARKER_FILENAME)) as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists but belongs to another user
+        return True
+    return True
+
+def _entry_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                continue
+    return total
+
+class ScratchManager:
+    """Owns every scratch root the services write to, their leases and the janitor."""
+
+    def __init__(self):
+        self.roots = {
+            # Short-lived per-request audio; point SCRATCH_AUDIO_DIR at tmpfs (e.g. /dev/shm)
+            "audio": ScratchRoot("audio", settings.SCRATCH_AUDIO_DIR, settings.SCRATCH_ORPHAN_MAX_AGE_SECONDS),
+            "evaluation": ScratchRoot("evaluation", settings.SCRATCH_EVALUATION_DIR, settings.SCRATCH_ORPHAN_MAX_AGE_SECONDS),
+            "checkpoints": ScratchRoot("checkpoints", settings.EVALUATION_CHECKPOINT_DIR, settings.EVALUATION_ARTIFACT_MAX_AGE_SECONDS),
+            "runs": ScratchRoot("runs", settings.EVALUATION_RUNS_DIR, settings.EVALUATION_ARTIFACT_MAX_AGE_SECONDS),
+            # Uploaded models live on disk and are never swept
+            "models": ScratchRoot("models", settings.MODEL_STORAGE_DIR),
+        }
+        self.stats = {
+            "leases_opened": 0,
+            "quota_rejections": 0,
+            "admission_rejections": 0,
+            "janitor_runs": 0,
+            "janitor_removed_entries": 0,
+            "janitor_freed_bytes": 0,
+        }
+        self._active_paths = set()
+        self._lock = threading.Lock()
+        self._janitor_thread = None
+
+    def root(self, name: str) -> ScratchRoot:
+        return self.roots[name]
+
+    def lease(self, root_name: str, quota_bytes: int = None) -> ScratchLease:
+        lease = ScratchLease(self.roots[root_name], quota_bytes or settings.SCRATCH_REQUEST_QUOTA_MB * MB)
+        with self._lock:
+            self._active_paths.add(lease.path)
+            self.stats["leases_opened"] += 1
+        return lease
+
+    def _release_lease(self, lease: ScratchLease) -> None:
+        with self._lock:
+            self._active_paths.discard(lease.path)
+
+    def sweep(self) -> int:
+        """
+        Removes expired entries that no live lease owns, in this or any other process.
+        Returns the number removed.
+        """
+        removed = 0
+        now = time.time()
+        for root in self.roots.values():
+            if root.max_age_seconds is None or not os.path.isdir(root.path):
+                continue
+            for entry in os.scandir(root.path):
+                with self._lock:
+                    if entry.path in self._active_paths:
+                        continue
+                try:
+                    if now - entry.stat().st_mtime < root.max_age_seconds:
+                        continue
+                    # A lease directory's mtime stops changing once its files are written, so a
+                    # long evaluation in another worker would otherwise look orphaned
+                    if entry.is_dir(follow_symlinks=False) and _lease_owner_alive(entry.path):
+                        continue
+                    size = _entry_size(entry.path)
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path)
+                    else:
+                        os.remove(entry.path)
+                except OSError as e:
+                    print(f"[SCRATCH] Could not remove '{entry.path}': {e}")
+                    continue
+                removed += 1
+                self.stats["janitor_removed_entries"] += 1
+                self.stats["janitor_freed_bytes"] += size
+        self.stats["janitor_runs"] += 1
+        if removed:
+            print(f"[SCRATCH] Janitor removed {removed} orphaned entries.")
+        return removed
+
+    def start_janitor(self) -> None:
+        """Starts the background janitor thread (idempotent)."""
+        if self._janitor_thread is not None:
+            return
+        for root in self.roots.values():
+            root.ensure()
+
+        def run():
+            while True:
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"[SCRATCH] Janitor sweep failed: {e}")
+                time.sleep(settings.SCRATCH_JANITOR_INTERVAL_SECONDS)
+
+        self._janitor_thread = threading.Thread(target=run, name="scratch-janitor", daemon=True)
+        self._janitor_thread.start()
+
+    def usage(self) -> dict:
+        with self._lock:
+            active_leases = len(self._active_paths)
+        return {
+            "roots": {name: root.usage() for name, root in self.roots.items()},
+            "active_leases": active_leases,
+            **self.stats,
+        }
+
+# Create the single, importable instance of the scratch manager
+scratch_manager = ScratchManager()
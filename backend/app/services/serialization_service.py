@@ -0,0 +1,44 @@
+import io
+import msgpack
+import numpy as np
+
+# Binary encodings for prediction payloads. JSON responses go through FastAPI's
+# ORJSONResponse, which serializes numpy arrays natively.
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+NPZ_MEDIA_TYPE = "application/octet-stream"
+
+class SerializationError(Exception):
+    """Custom exception for payload encoding errors."""
+    pass
+
+def _encode_numpy(obj):
+    """msgpack hook: arrays become {dtype, shape, data} with raw little-endian bytes."""
+    if isinstance(obj, np.ndarray):
+        array = np.ascontiguousarray(obj)
+        if array.dtype.byteorder == ">":
+            array = array.byteswap().view(array.dtype.newbyteorder("<"))
+        return {"dtype": array.dtype.str, "shape": list(array.shape), "data": array.tobytes()}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Cannot serialize object of type {type(obj).__name__}")
+
+def to_msgpack(content) -> bytes:
+    return msgpack.packb(content, default=_encode_numpy, use_bin_type=True)
+
+def to_npz(columns: dict) -> bytes:
+    """
+    Packs a columnar payload into an .npz archive. Arrays are stored as-is; lists of
+    strings become unicode arrays, with None stored as an empty string.
+    """
+    arrays = {}
+    for name, column in columns.items():
+        if isinstance(column, np.ndarray):
+            arrays[name] = column
+        elif isinstance(column, list) and all(value is None or isinstance(value, str) for value in column):
+            arrays[name] = np.array(["" if value is None else value for value in column], dtype=str)
+        else:
+            raise SerializationError(f"Column '{name}' cannot be stored in an .npz archive.")
+
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
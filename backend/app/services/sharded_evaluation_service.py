@@ -0,0 +1,205 @@
+import os
+import json
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError, as_completed
+import numpy as np
+import torch
+
+from app.core.config import settings
+from app.services.model_services import model_loader, UPLOAD_DIRECTORY
+from app.services import audio_service
+from app.services.scratch_service import scratch_manager
+from app.services.resource_governor import governor
+
+# One subdirectory per run id, holding meta.json and one result file per finished shard
+CHECKPOINT_DIR = scratch_manager.root("checkpoints").path
+
+INFERENCE_BATCH_SIZE = 32
+# Part of the run id, so checkpoints written in an older result format are never resumed
+CHECKPOINT_FORMAT_VERSION = 2
+
+class ShardedEvaluationError(Exception):
+    """Custom exception for sharded evaluation errors."""
+    pass
+
+def compute_run_id(model_filename: str, filepaths: list, true_labels: list, shard_size: int) -> str:
+    """
+    Derives a stable run id from the model file, the dataset contents and the sharding,
+    so re-submitting the same evaluation finds the checkpoints of the interrupted run.
+    """
+    model_path = os.path.join(UPLOAD_DIRECTORY, model_filename)
+    digest = hashlib.sha1()
+    digest.update(f"v{CHECKPOINT_FORMAT_VERSION}:{model_filename}:{os.path.getmtime(model_path)}:{shard_size}\n".encode())
+    for path, label in zip(filepaths, true_labels):
+        digest.update(f"{path}\t{label}\n".encode())
+    return digest.hexdigest()[:16]
+
+def split_into_shards(filepaths: list, true_labels: list, shard_size: int) -> list:
+    """Splits the file list into (shard_id, filepaths, labels) tuples of at most shard_size files."""
+    return [
+        (shard_id, filepaths[start:start + shard_size], true_labels[start:start + shard_size])
+        for shard_id, start in enumerate(range(0, len(filepaths), shard_size))
+    ]
+
+def _shard_result_path(run_dir: str, shard_id: int) -> str:
+    return os.path.join(run_dir, f"shard_{shard_id:05d}.json")
+
+def _save_shard_result(run_dir: str, shard_id: int, result: dict) -> None:
+    """Writes atomically, so a worker killed mid-write never leaves a half-written checkpoint."""
+    final_path = _shard_result_path(run_dir, shard_id)
+    temp_path = final_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(result, f)
+    os.replace(temp_path, final_path)
+
+def _load_shard_result(run_dir: str, shard_id: int):
+    path = _shard_result_path(run_dir, shard_id)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+# --- Worker process side ---
+
+_worker_class_labels = []
+_worker_label_index = {}
+
+def _init_worker(model_filename: str, model_class_labels: list, torch_threads: int) -> None:
+    """Loads a private copy of the model into each worker process."""
+    global _worker_class_labels, _worker_label_index
+    # One intra-op thread per worker: parallelism comes from the process pool, and
+    # letting every worker use all cores oversubscribes the CPU.
+    torch.set_num_threads(torch_threads)
+    model_loader.load_model(model_filename)
+    _, metadata = model_loader.get_model()
+    _worker_class_labels = metadata.class_labels if metadata.class_labels else []
+    _worker_label_index = {label: i for i, label in enumerate(model_class_labels)}
+
+def _evaluate_shard(shard_id: int, filepaths: list, true_labels: list) -> dict:
+    """
+    Evaluates one shard and returns its confusion matrix, failure count and, per true
+    label, the files predicted as a class outside the report labels.
+    """
+    model, metadata = model_loader.get_model()
+    target_sr = metadata.sample_rate if metadata.sample_rate else audio_service.DEFAULT_SAMPLE_RATE
+    num_labels = len(_worker_label_index)
+    matrix = np.zeros((num_labels, num_labels), dtype=np.int64)
+    unmatched = [0] * num_labels
+    failed = 0
+
+    def score(features: list, labels: list) -> None:
+        probabilities = audio_service.run_inference(model, np.stack(features))
+        for true_label, predicted_index in zip(labels, probabilities.argmax(dim=1).tolist()):
+            predicted_label = audio_service.label_for_index(predicted_index, _worker_class_labels)
+            if predicted_label in _worker_label_index:
+                matrix[_worker_label_index[true_label], _worker_label_index[predicted_label]] += 1
+            else:
+                # Still a miss for the true class, as in /run and /run_approximate
+                unmatched[_worker_label_index[true_label]] += 1
+
+    features, labels = [], []
+    for file_path, true_label in zip(filepaths, true_labels):
+        try:
+            audio = audio_service.load_audio(file_path, target_sr, audio_service.WINDOW_SAMPLES)
+            features.append(audio_service.compute_log_mel(audio, target_sr))
+            labels.append(true_label)
+        except Exception as e:
+            print(f"  - FAILED to process '{file_path}'. Error: {e}")
+            failed += 1
+            continue
+        if len(features) == INFERENCE_BATCH_SIZE:
+            score(features, labels)
+            features, labels = [], []
+    if features:
+        score(features, labels)
+
+    return {"shard_id": shard_id, "confusion_matrix": matrix.tolist(), "unmatched": unmatched, "failed": failed}
+
+# --- Coordinator side ---
+
+def run_sharded_evaluation(filepaths: list, true_labels: list, model_filename: str,
+                           model_class_labels: list, num_workers: int = 0, shard_size: int = 0,
+                           resume: bool = True) -> dict:
+    """
+    Splits the dataset into shards and evaluates them in a pool of worker processes, each
+    holding its own model copy. Every finished shard is checkpointed under the run id;
+    re-running the same evaluation skips shards that already have a result. Returns the
+    merged confusion matrix and per-label unmatched counts together with run bookkeeping.
+
+    The pool runs beside live traffic without taking inference slots, so by default it
+    only gets the cores the governor doesn't reserve for concurrent inferences:
+    core_budget - inference_concurrency single-threaded workers, at least one.
+    EVALUATION_WORKERS overrides that default.
+    """
+    # A request may ask for fewer workers than configured, never more: every worker is
+    # a separate process with its own copy of the model
+    max_workers = settings.EVALUATION_WORKERS or max(1, governor.core_budget - governor.inference_concurrency)
+    num_workers = min(num_workers, max_workers) if num_workers > 0 else max_workers
+    shard_size = shard_size or settings.EVALUATION_SHARD_SIZE
+
+    try:
+        run_id = compute_run_id(model_filename, filepaths, true_labels, shard_size)
+    except OSError as e:
+        raise ShardedEvaluationError(f"Model file not available to workers: {e}")
+    run_dir = os.path.join(CHECKPOINT_DIR, run_id)
+    os.makedirs(run_dir, exist_ok=True)
+    with open(os.path.join(run_dir, "meta.json"), "w") as f:
+        json.dump({"model_filename": model_filename, "total_files": len(filepaths), "shard_size": shard_size}, f)
+
+    shards = split_into_shards(filepaths, true_labels, shard_size)
+    results = {}
+    if resume:
+        for shard_id, _, _ in shards:
+            saved = _load_shard_result(run_dir, shard_id)
+            if saved is not None:
+                results[shard_id] = saved
+    resumed = len(results)
+    pending = [shard for shard in shards if shard[0] not in results]
+    print(f"[SHARDED EVAL] Run {run_id}: {len(shards)} shards, {resumed} resumed, {len(pending)} to run on {num_workers} workers.")
+
+    if pending:
+        # 'spawn' rather than fork: forking a process that has already used torch's
+        # thread pool can deadlock the children.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=min(num_workers, len(pending)), mp_context=context,
+            initializer=_init_worker, initargs=(model_filename, model_class_labels, 1)
+        ) as executor:
+            futures = [executor.submit(_evaluate_shard, *shard) for shard in pending]
+            error = None
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except CancelledError:
+                    continue
+                except Exception as e:
+                    if error is None:
+                        error = e
+                        # Drop the shards that haven't started; the ones already running
+                        # still finish and are checkpointed, so no work is thrown away
+                        for other in futures:
+                            other.cancel()
+                    continue
+                _save_shard_result(run_dir, result["shard_id"], result)
+                results[result["shard_id"]] = result
+                print(f"[SHARDED EVAL] Run {run_id}: {len(results)}/{len(shards)} shards done.")
+        if error is not None:
+            # Finished shards are on disk, so the run can be resumed
+            raise ShardedEvaluationError(f"Evaluation worker failed (run {run_id} can be resumed): {error}")
+
+    num_labels = len(model_class_labels)
+    merged = np.zeros((num_labels, num_labels), dtype=np.int64)
+    unmatched = np.zeros(num_labels, dtype=np.int64)
+    for result in results.values():
+        merged += np.asarray(result["confusion_matrix"], dtype=np.int64)
+        unmatched += np.asarray(result["unmatched"], dtype=np.int64)
+
+    return {
+        "run_id": run_id,
+        "confusion_matrix": merged,
+        "unmatched": unmatched,
+        "failed_files": sum(result["failed"] for result in results.values()),
+        "shards_total": len(shards),
+        "shards_resumed": resumed,
+    }
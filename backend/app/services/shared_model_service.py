@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import warnings
+import threading
+import numpy as np
+import torch
+
+from app.core.config import settings
+from app.models.model_schemas import ModelMetadata
+from app.models.torch_model import SimpleCNN
+from app.services.model_services import model_loader, ModelServiceError, UPLOAD_DIRECTORY
+
+# Cross-worker model distribution. The worker that handles /api/model/load writes the
+# weights once into SHARED_MODEL_DIR (tmpfs by default) as a flat binary file plus a
+# JSON manifest, then atomically repoints current.json at it. Every worker polls
+# current.json and, when the generation changes, memory-maps the weights read-only and
+# builds the model around them, so all workers share one physical copy.
+POINTER_FILENAME = "current.json"
+# Tensor offsets in the weights file are aligned for efficient, valid dtype views
+TENSOR_ALIGNMENT = 64
+GENERATIONS_TO_KEEP = 2
+
+class SharedModelError(Exception):
+    """Custom exception for shared model distribution errors."""
+    pass
+
+def _path(name: str) -> str:
+    return os.path.join(settings.SHARED_MODEL_DIR, name)
+
+def _write_json_atomic(name: str, content: dict) -> None:
+    temp_path = _path(name) + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(content, f)
+    os.replace(temp_path, _path(name))
+
+def _read_json(name: str):
+    try:
+        with open(_path(name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def publish(filename: str, model, metadata: ModelMetadata) -> int:
+    """
+    Publishes a loaded model to every worker and returns its generation. State-dict
+    checkpoints are shared as raw weights; TorchScript models can't be rebuilt from a
+    state dict, so for those only the filename is shared and each worker loads the file.
+    """
+    os.makedirs(settings.SHARED_MODEL_DIR, exist_ok=True)
+    generation = time.time_ns()
+    file_path = os.path.join(UPLOAD_DIRECTORY, filename)
+    manifest = {
+        "generation": generation,
+        "filename": filename,
+        "file_mtime": os.path.getmtime(file_path) if os.path.exists(file_path) else None,
+        "metadata": metadata.model_dump(),
+    }
+
+    if isinstance(model, torch.jit.ScriptModule):
+        manifest["kind"] = "file"
+    else:
+        weights_name = f"gen_{generation}.bin"
+        layout = []
+        offset = 0
+        with open(_path(weights_name) + ".tmp", "wb") as f:
+            for name, tensor in model.state_dict().items():
+                array = tensor.detach().cpu().contiguous().numpy()
+                padding = -offset % TENSOR_ALIGNMENT
+                f.write(b"\0" * padding)
+                offset += padding
+                f.write(array.tobytes())
+                layout.append({"name": name, "dtype": array.dtype.str, "shape": list(array.shape), "offset": offset})
+                offset += array.nbytes
+        os.replace(_path(weights_name) + ".tmp", _path(weights_name))
+        manifest.update({"kind": "weights", "weights": weights_name, "layout": layout})
+
+    manifest_name = f"gen_{generation}.json"
+    _write_json_atomic(manifest_name, manifest)
+    # Repointing current.json is what the other workers notice
+    _write_json_atomic(POINTER_FILENAME, {"generation": generation, "manifest": manifest_name})
+    _prune_old_generations(generation)
+    print(f"[SHARED MODEL] Published '{filename}' as generation {generation}.")
+    return generation
+
+def _prune_old_generations(current_generation: int) -> None:
+    """Deletes all but the newest generations. Workers still mapping a deleted file keep it alive until they switch."""
+    generations = sorted({
+        int(name.split("_")[1].split(".")[0])
+        for name in os.listdir(settings.SHARED_MODEL_DIR)
+        if name.startswith("gen_") and not name.endswith(".tmp")
+    })
+    for generation in generations[:-GENERATIONS_TO_KEEP]:
+        if generation == current_generation:
+            continue
+        for suffix in (".json", ".bin"):
+            try:
+                os.remove(_path(f"gen_{generation}{suffix}"))
+            except FileNotFoundError:
+                pass
+
+def attach(manifest: dict):
+    """Builds a model from a published manifest; returns (model, metadata)."""
+    metadata = ModelMetadata(**manifest["metadata"])
+
+    if manifest["kind"] == "file":
+        try:
+            model_loader.load_model(manifest["filename"], activate=False)
+            model, _ = model_loader.get_cached_model(manifest["filename"])
+        except ModelServiceError as e:
+            raise SharedModelError(f"Could not load shared model file '{manifest['filename']}': {e}")
+        return model, metadata
+
+    weights = np.memmap(_path(manifest["weights"]), dtype=np.uint8, mode="r")
+    state_dict = {}
+    with warnings.catch_warnings():
+        # The tensors are deliberately backed by a read-only mapping; inference never writes to weights
+        warnings.filterwarnings("ignore", message=".*not writable.*")
+        for entry in manifest["layout"]:
+            dtype = np.dtype(entry["dtype"])
+            count = int(np.prod(entry["shape"], dtype=np.int64))
+            array = weights[entry["offset"]:entry["offset"] + count * dtype.itemsize].view(dtype).reshape(entry["shape"])
+            state_dict[entry["name"]] = torch.from_numpy(np.asarray(array))
+
+    # Build on the meta device so no private weight memory is allocated, then point
+    # the parameters at the shared tensors
+    with torch.device("meta"):
+        model = SimpleCNN(num_classes=metadata.num_classes)
+    model.load_state_dict(state_dict, assign=True)
+    model.eval()
+    return model, metadata
+
+def read_current_manifest():
+    pointer = _read_json(POINTER_FILENAME)
+    if pointer is None:
+        return None
+    return _read_json(pointer["manifest"])
+
+def is_stale(manifest: dict) -> bool:
+    """
+    True when the model file on disk was replaced after the manifest was published.
+    SHARED_MODEL_DIR outlives server restarts, so a redeploy can leave old weights behind.
+    """
+    file_path = os.path.join(UPLOAD_DIRECTORY, manifest["filename"])
+    if manifest["file_mtime"] is None or not os.path.exists(file_path):
+        return False
+    return os.path.getmtime(file_path) != manifest["file_mtime"]
+
+def load_and_publish(filename: str) -> ModelMetadata:
+    """Loads a model in this worker, publishes it and switches this worker to the shared copy."""
+    model_loader.load_model(filename, activate=False)
+    model, metadata = model_loader.get_cached_model(filename)
+    publish(filename, model, metadata)
+    # Swap the private copy just loaded for the mapped one right away instead of on the next poll
+    shared_model_watcher.sync()
+    return metadata
+
+class SharedModelWatcher:
+    """Polls current.json and switches this worker to each newly published generation."""
+
+    def __init__(self):
+        self.generation = None
+        self.last_error = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def sync(self) -> bool:
+        """Attaches to the current generation if it is new. Returns True when a switch happened."""
+        with self._lock:
+            pointer = _read_json(POINTER_FILENAME)
+            if pointer is None or pointer["generation"] == self.generation:
+                return False
+            manifest = _read_json(pointer["manifest"])
+            if manifest is None:
+                return False
+            if is_stale(manifest):
+                # Never serve weights older than the file; load it privately until a fresh generation is published
+                model_loader.load_model(manifest["filename"])
+                self.generation = manifest["generation"]
+                print(f"[SHARED MODEL] Generation {self.generation} is older than '{manifest['filename']}' on disk; "
+                      f"worker {os.getpid()} loaded a private copy instead.")
+                return True
+            model, metadata = attach(manifest)
+            model_loader.activate_model(manifest["filename"], model, metadata, manifest["file_mtime"])
+            self.generation = manifest["generation"]
+            self.last_error = None
+            print(f"[SHARED MODEL] Worker {os.getpid()} switched to '{manifest['filename']}' (generation {self.generation}).")
+            return True
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    self.sync()
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"[SHARED MODEL] Sync failed: {e}")
+                time.sleep(settings.SHARED_MODEL_POLL_SECONDS)
+
+        self._thread = threading.Thread(target=run, name="shared-model-watcher", daemon=True)
+        self._thread.start()
+
+    def status(self) -> dict:
+        return {"enabled": settings.SHARED_MODELS_ENABLED, "generation": self.generation, "last_error": self.last_error}
+
+# Create the single, importable instance of the watcher
+shared_model_watcher = SharedModelWatcher()
@@ -0,0 +1,171 @@
+import time
+import wave
+import numpy as np
+
+from app.core.config import settings
+from app.services.model_services import model_loader, ModelServiceError
+from app.services import audio_service
+from app.services.scratch_service import scratch_manager
+from app.services import shared_model_service
+from app.services.shared_model_service import shared_model_watcher
+
+# Synthetic clips are written at a rate that differs from every model's sample rate,
+# so the resampler filters are built during warmup too.
+WARMUP_SOURCE_SAMPLE_RATE = 44100
+
+class _StartupState:
+    """Tracks the progress of the startup sequence for the readiness probe."""
+    ready = False
+    stage = "pending"
+    preloaded_models = []
+    errors = []
+    duration_seconds = None
+
+startup_state = _StartupState()
+
+def get_status() -> dict:
+    """Returns the readiness state in a JSON-friendly form."""
+    return {
+        "ready": startup_state.ready,
+        "stage": startup_state.stage,
+        "preloaded_models": list(startup_state.preloaded_models),
+        "errors": list(startup_state.errors),
+        "duration_seconds": startup_state.duration_seconds,
+    }
+
+def _write_synthetic_wav(file_path: str, seconds: float, sample_rate: int) -> None:
+    """Writes a 16-bit mono WAV of a tone plus noise, close enough to real audio for warmup."""
+    n_samples = max(int(seconds * sample_rate), audio_service.N_FFT)
+    t = np.arange(n_samples) / sample_rate
+    signal = 0.5 * np.sin(2 * np.pi * 440.0 * t) + 0.05 * np.random.randn(n_samples)
+    pcm = (np.clip(signal, -1.0, 1.0) * 32767).astype(np.int16)
+
+    with wave.open(file_path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+
+def warmup_frontend(target_sr: int, audio_seconds: float) -> np.ndarray:
+    """
+    Decodes, resamples and featurizes a synthetic clip, triggering librosa's JIT
+    compilation and filter construction. Returns the resulting log-mel spectrogram.
+    """
+    with scratch_manager.lease("audio") as scratch:
+        temp_file_path = scratch.file_path("warmup.wav")
+        _write_synthetic_wav(temp_file_path, audio_seconds, WARMUP_SOURCE_SAMPLE_RATE)
+        audio = audio_service.load_audio(temp_file_path, target_sr, audio_service.WINDOW_SAMPLES)
+        return audio_service.compute_log_mel(audio, target_sr)
+
+def warmup_model(model, metadata, batch_sizes: list, audio_seconds: float) -> None:
+    """
+    Runs synthetic audio through decode -> log-mel -> forward once for every batch size,
+    so torch's first-forward allocations happen before real traffic arrives.
+    """
+    target_sr = metadata.sample_rate if metadata.sample_rate else audio_service.DEFAULT_SAMPLE_RATE
+    features = warmup_frontend(target_sr, audio_seconds)
+    for batch_size in batch_sizes:
+        batch = np.repeat(features[np.newaxis], batch_size, axis=0)
+        audio_service.run_inference(model, batch)
+
+def run_startup_sequence() -> None:
+    """
+    Preloads the configured checkpoints (or, with shared models, attaches to the shared
+    one) and warms up each of them. Readiness flips to
+    true only once this has finished; failures are recorded rather than raised so a
+    bad checkpoint doesn't keep the server from coming up.
+    """
+    start = time.perf_counter()
+    startup_state.ready = False
+    startup_state.errors = []
+    startup_state.preloaded_models = []
+    # Runs as a fire-and-forget executor job, so nothing may escape: an uncaught error
+    # would be lost and leave /api/ready at 503 with no explanation
+    try:
+        _run_startup_stages()
+    except Exception as e:
+        startup_state.errors.append(f"Startup sequence failed during '{startup_state.stage}': {e}")
+        print(f"[STARTUP] Startup sequence failed during '{startup_state.stage}': {e}")
+    finally:
+        startup_state.duration_seconds = round(time.perf_counter() - start, 3)
+        startup_state.stage = "complete"
+        startup_state.ready = True
+
+def _run_startup_stages() -> None:
+    if settings.SHARED_MODELS_ENABLED:
+        _attach_shared_model()
+    else:
+        _preload_models()
+
+    if settings.WARMUP_ENABLED:
+        startup_state.stage = "warming_up"
+        if settings.SHARED_MODELS_ENABLED:
+            # Warm the model this worker actually serves: the one attached to shared weights
+            try:
+                model, metadata = model_loader.get_model()
+                targets = [(model_loader.get_model_filename(), model, metadata)]
+            except ModelServiceError:
+                targets = []
+        else:
+            targets = [(filename, *model_loader.get_cached_model(filename)) for filename in startup_state.preloaded_models]
+
+        if not targets:
+            # No model to run, but the audio front-end can still be initialised
+            try:
+                warmup_frontend(audio_service.DEFAULT_SAMPLE_RATE, settings.WARMUP_AUDIO_SECONDS)
+            except Exception as e:
+                startup_state.errors.append(f"Front-end warmup failed: {e}")
+        for filename, model, metadata in targets:
+            try:
+                warmup_model(model, metadata, settings.WARMUP_BATCH_SIZES, settings.WARMUP_AUDIO_SECONDS)
+                print(f"[STARTUP] Warmed up '{filename}' for batch sizes {settings.WARMUP_BATCH_SIZES}.")
+            except Exception as e:
+                startup_state.errors.append(f"Warmup of '{filename}' failed: {e}")
+                print(f"[STARTUP] Warmup of '{filename}' failed: {e}")
+
+def _preload_models() -> None:
+    startup_state.stage = "preloading"
+    for filename in settings.PRELOAD_MODELS:
+        try:
+            # The first preload that succeeds becomes the active model
+            model_loader.load_model(filename, activate=not startup_state.preloaded_models)
+            startup_state.preloaded_models.append(filename)
+            print(f"[STARTUP] Preloaded model '{filename}'.")
+        except ModelServiceError as e:
+            startup_state.errors.append(f"Preload of '{filename}' failed: {e}")
+            print(f"[STARTUP] Preload of '{filename}' failed: {e}")
+
+def _attach_shared_model() -> None:
+    """
+    With shared models nothing is preloaded privately: the worker attaches to the
+    current generation. Only when there is none (or it predates the file on disk) does
+    it load a model to publish: the stale file, else the first PRELOAD_MODELS entry
+    that loads. The private copy is swapped for the mapped one once published.
+    """
+    startup_state.stage = "attaching_shared_model"
+    manifest = shared_model_service.read_current_manifest()
+    if manifest is None:
+        candidates = list(settings.PRELOAD_MODELS)
+    elif shared_model_service.is_stale(manifest):
+        # The shared weights predate the file on disk (e.g. after a redeploy); republish it
+        print(f"[STARTUP] Shared generation of '{manifest['filename']}' is stale; republishing.")
+        candidates = [manifest["filename"]]
+    else:
+        candidates = []
+
+    for filename in candidates:
+        try:
+            shared_model_service.load_and_publish(filename)
+            startup_state.preloaded_models.append(filename)
+            print(f"[STARTUP] Published model '{filename}' to the other workers.")
+            break
+        except Exception as e:
+            startup_state.errors.append(f"Publishing '{filename}' failed: {e}")
+            print(f"[STARTUP] Publishing '{filename}' failed: {e}")
+
+    try:
+        shared_model_watcher.sync()
+    except Exception as e:
+        startup_state.errors.append(f"Attaching the shared model failed: {e}")
+        print(f"[STARTUP] Attaching the shared model failed: {e}")
+    shared_model_watcher.start()
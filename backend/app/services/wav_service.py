@@ -0,0 +1,117 @@
+import os
+import struct
+import numpy as np
+
+# Fast path for uncompressed WAV. The RIFF header is parsed directly and the PCM data
+# chunk is memory-mapped, so only the frames a caller asks for are touched and
+# converted to float32. Anything this module doesn't understand (compressed WAV
+# codecs, RF64, truncated headers) raises WavFormatError and callers fall back to
+# librosa's general decoder.
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Scale factors matching libsndfile's integer -> float conversion, which is what librosa.load returns
+_INT_SCALE = {1: 1.0 / 128, 2: 1.0 / 32768, 3: 1.0 / 8388608, 4: 1.0 / 2147483648}
+
+class WavFormatError(Exception):
+    """Raised when a file is not a WAV this module can read directly."""
+    pass
+
+class WavInfo:
+    """Layout of a WAV file's PCM data region."""
+
+    def __init__(self, sample_rate: int, channels: int, sample_width: int, is_float: bool, data_offset: int, num_frames: int):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.is_float = is_float
+        self.data_offset = data_offset
+        self.num_frames = num_frames
+
+def is_wav_path(file_path: str) -> bool:
+    return file_path.lower().endswith(".wav")
+
+def read_header(file_path: str) -> WavInfo:
+    """Walks the RIFF chunks up to 'data' and returns where the PCM samples are and how they are encoded."""
+    file_size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            raise WavFormatError("Not a RIFF/WAVE file.")
+
+        fmt = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise WavFormatError("No 'data' chunk found.")
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+
+            if chunk_id == b"fmt ":
+                if chunk_size < 16:
+                    raise WavFormatError("Malformed 'fmt ' chunk.")
+                fmt = f.read(chunk_size)
+                if chunk_size % 2:
+                    f.seek(1, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise WavFormatError("'data' chunk precedes 'fmt ' chunk.")
+                data_offset = f.tell()
+                # Streamed writers leave the size as 0 or 0xFFFFFFFF; trust the file length then
+                data_size = min(chunk_size, file_size - data_offset) if chunk_size else file_size - data_offset
+                break
+            else:
+                f.seek(chunk_size + (chunk_size % 2), os.SEEK_CUR)
+
+    format_tag, channels, sample_rate, _, block_align, bits_per_sample = struct.unpack("<HHIIHH", fmt[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE:
+        if len(fmt) < 26:
+            raise WavFormatError("Malformed WAVE_FORMAT_EXTENSIBLE header.")
+        # The first two bytes of the sub-format GUID carry the actual format tag
+        format_tag = struct.unpack("<H", fmt[24:26])[0]
+
+    sample_width = bits_per_sample // 8
+    if format_tag == WAVE_FORMAT_PCM and sample_width in _INT_SCALE:
+        is_float = False
+    elif format_tag == WAVE_FORMAT_IEEE_FLOAT and sample_width in (4, 8):
+        is_float = True
+    else:
+        raise WavFormatError(f"Unsupported WAV encoding (format 0x{format_tag:04x}, {bits_per_sample} bits).")
+    if channels < 1 or block_align != channels * sample_width or bits_per_sample % 8:
+        raise WavFormatError("Inconsistent WAV block alignment.")
+
+    return WavInfo(sample_rate, channels, sample_width, is_float, data_offset, data_size // block_align)
+
+def read_frames(file_path: str, max_frames: int = None, info: WavInfo = None) -> tuple:
+    """
+    Returns (mono float32 signal, sample rate) for the first max_frames frames (all
+    frames when None). Only that part of the data chunk is mapped and converted.
+    """
+    info = info or read_header(file_path)
+    num_frames = info.num_frames if max_frames is None else min(info.num_frames, max_frames)
+    if num_frames == 0:
+        return np.zeros(0, dtype=np.float32), info.sample_rate
+
+    if info.sample_width == 3:
+        raw = np.memmap(file_path, dtype=np.uint8, mode="r", offset=info.data_offset, shape=(num_frames, info.channels, 3))
+        # Little-endian 24-bit: place the three bytes in the top of an int32 to keep the sign
+        samples = (raw[..., 0].astype(np.int32) << 8) | (raw[..., 1].astype(np.int32) << 16) | (raw[..., 2].astype(np.int32) << 24)
+        samples = samples.astype(np.float32) * np.float32(1.0 / 2147483648)
+    else:
+        if info.is_float:
+            dtype = np.dtype("<f4") if info.sample_width == 4 else np.dtype("<f8")
+        else:
+            dtype = {1: np.dtype("u1"), 2: np.dtype("<i2"), 4: np.dtype("<i4")}[info.sample_width]
+        raw = np.memmap(file_path, dtype=dtype, mode="r", offset=info.data_offset, shape=(num_frames, info.channels))
+        if info.is_float:
+            samples = raw.astype(np.float32)
+        elif info.sample_width == 1:
+            # 8-bit WAV is unsigned with its midpoint at 128
+            samples = (raw.astype(np.float32) - 128.0) * np.float32(_INT_SCALE[1])
+        else:
+            samples = raw.astype(np.float32) * np.float32(_INT_SCALE[info.sample_width])
+    del raw
+
+    audio = samples[:, 0] if info.channels == 1 else samples.mean(axis=1)
+    return np.ascontiguousarray(audio, dtype=np.float32), info.sample_rate
@@ -0,0 +1,70 @@
+import os
+import json
+import time
+import zipfile
+import argparse
+import tempfile
+
+from app.services import dataset_service, evaluation_service, feature_shard_service
+from app.services.audio_service import DEFAULT_SAMPLE_RATE
+from app.services.model_services import model_loader
+
+# Offline feature shards: decode a labeled dataset once, then evaluate any number of
+# models over the stored log-mels without touching the audio again.
+#
+#   python feature_shards.py build ../audio_sample ./features/audio_sample
+#   python feature_shards.py evaluate ./features/audio_sample --model trained_model.pth
+
+def build(dataset: str, out_dir: str, sample_rate: int, shard_size: int) -> None:
+    with tempfile.TemporaryDirectory() as extract_dir:
+        if dataset.lower().endswith(".zip"):
+            print(f"Extracting '{dataset}'...")
+            with zipfile.ZipFile(dataset, "r") as zf:
+                zf.extractall(extract_dir)
+            base_path = extract_dir
+        else:
+            base_path = dataset
+
+        # Class labels are the dataset's top-level folder names, as in an evaluation zip
+        class_labels = dataset_service.discover_class_labels(base_path)
+        filepaths, labels = dataset_service.parse_dataset(base_path, class_labels)
+        if not filepaths:
+            raise SystemExit("Dataset is empty or has an invalid structure.")
+        file_ids = [os.path.relpath(path, base_path) for path in filepaths]
+
+        print(f"Featurizing {len(filepaths)} files across {len(class_labels)} classes at {sample_rate} Hz...")
+        start = time.perf_counter()
+        index = feature_shard_service.build_shards(filepaths, labels, file_ids, out_dir, sample_rate, shard_size)
+        elapsed = time.perf_counter() - start
+
+    print(f"\n✓ Wrote {len(index['items'])} clips in {len(index['shards'])} shards to '{out_dir}' "
+          f"({len(index['failed'])} failed, {elapsed:.1f}s)")
+
+def evaluate(shard_dir: str, model_filename: str) -> None:
+    model_loader.load_model(model_filename)
+    start = time.perf_counter()
+    result = evaluation_service.evaluate_feature_shards(shard_dir)
+    elapsed = time.perf_counter() - start
+    print(json.dumps(result, indent=2))
+    scored = sum(sum(row) for row in result["confusion_matrix"])
+    print(f"\n✓ Evaluated {scored} clips in {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and evaluate precomputed log-mel feature shards.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Convert a labeled audio directory or .zip into feature shards.")
+    build_parser.add_argument("dataset", help="Directory or .zip with one subfolder per class label.")
+    build_parser.add_argument("out_dir", help="Directory to write the shards and index.json into.")
+    build_parser.add_argument("--sample-rate", type=int, default=DEFAULT_SAMPLE_RATE)
+    build_parser.add_argument("--shard-size", type=int, default=feature_shard_service.DEFAULT_SHARD_SIZE)
+
+    eval_parser = subparsers.add_parser("evaluate", help="Evaluate a model over existing feature shards.")
+    eval_parser.add_argument("shard_dir", help="Directory produced by the 'build' command.")
+    eval_parser.add_argument("--model", required=True, help="Model filename inside temp_uploads.")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        build(args.dataset, args.out_dir, args.sample_rate, args.shard_size)
+    else:
+        evaluate(args.shard_dir, args.model)
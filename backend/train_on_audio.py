@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import random
+import argparse
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import Dataset, DataLoader
+
+from app.models.torch_model import SimpleCNN
+from app.services import dataset_service, feature_shard_service
+from app.services.audio_service import DEFAULT_SAMPLE_RATE
+
+# Trains SimpleCNN on a labeled audio directory (one subfolder per class, e.g. ../audio_sample).
+# Log-mels are computed once with the same front-end as audio_service and cached as
+# feature shards, so later epochs and later runs only read memory-mapped arrays.
+#
+#   python train_on_audio.py ../audio_sample --epochs 30 --output trained_model.pth
+
+SOURCE_FINGERPRINT_FILENAME = "source.json"
+
+def _source_fingerprint(base_path: str, filepaths: list, labels: list, sample_rate: int) -> dict:
+    """Identifies the dataset contents, so a stale feature cache is rebuilt."""
+    return {
+        "sample_rate": sample_rate,
+        "files": [
+            [os.path.relpath(path, base_path), label, os.path.getsize(path), os.path.getmtime(path)]
+            for path, label in zip(filepaths, labels)
+        ],
+    }
+
+def prepare_feature_cache(dataset_dir: str, cache_dir: str, sample_rate: int) -> dict:
+    """Returns the feature-shard index for the dataset, building the cache if it is missing or stale."""
+    class_labels = dataset_service.discover_class_labels(dataset_dir)
+    filepaths, labels = dataset_service.parse_dataset(dataset_dir, class_labels)
+    if not filepaths:
+        raise SystemExit("Dataset is empty or has an invalid structure.")
+
+    fingerprint = _source_fingerprint(dataset_dir, filepaths, labels, sample_rate)
+    fingerprint_path = os.path.join(cache_dir, SOURCE_FINGERPRINT_FILENAME)
+    if os.path.exists(fingerprint_path):
+        with open(fingerprint_path) as f:
+            if json.load(f) == fingerprint:
+                print(f"Using cached features from '{cache_dir}'.")
+                return feature_shard_service.load_index(cache_dir)
+
+    print(f"Computing features for {len(filepaths)} files into '{cache_dir}'...")
+    start = time.perf_counter()
+    file_ids = [os.path.relpath(path, dataset_dir) for path in filepaths]
+    index = feature_shard_service.build_shards(filepaths, labels, file_ids, cache_dir, sample_rate)
+    # Folders with no decodable files still count as classes of the dataset
+    index["class_labels"] = class_labels
+    with open(os.path.join(cache_dir, feature_shard_service.INDEX_FILENAME), "w") as f:
+        json.dump(index, f)
+    with open(fingerprint_path, "w") as f:
+        json.dump(fingerprint, f)
+    print(f"Features cached in {time.perf_counter() - start:.1f}s ({len(index['failed'])} files failed).")
+    return index
+
+class FeatureShardDataset(Dataset):
+    """Serves (log-mel, class index) pairs from memory-mapped feature shards."""
+
+    def __init__(self, shard_dir: str, index: dict, items: list):
+        self.shard_dir = shard_dir
+        self.shards = index["shards"]
+        self.items = items
+        self.label_to_index = {label: i for i, label in enumerate(index["class_labels"])}
+        # Opened lazily so every DataLoader worker maps the files itself
+        self._open_shards = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, i):
+        item = self.items[i]
+        shard = self._open_shards.get(item["shard"])
+        if shard is None:
+            shard = np.load(os.path.join(self.shard_dir, self.shards[item["shard"]]["file"]), mmap_mode="r")
+            self._open_shards[item["shard"]] = shard
+        features = torch.from_numpy(np.array(shard[item["row"]])).unsqueeze(0)
+        return features, self.label_to_index[item["label"]]
+
+def _make_loader(dataset: Dataset, batch_size: int, num_workers: int, shuffle: bool) -> DataLoader:
+    loader_options = {"num_workers": num_workers, "pin_memory": torch.cuda.is_available()}
+    if num_workers > 0:
+        loader_options.update({"prefetch_factor": 4, "persistent_workers": True})
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, **loader_options)
+
+def evaluate(model: nn.Module, loader: DataLoader, device: torch.device) -> float:
+    model.eval()
+    correct = total = 0
+    with torch.no_grad():
+        for features, targets in loader:
+            outputs = model(features.to(device, non_blocking=True))
+            correct += (outputs.argmax(dim=1).cpu() == targets).sum().item()
+            total += targets.numel()
+    return correct / total if total else 0.0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train SimpleCNN on a labeled audio directory.")
+    parser.add_argument("dataset_dir", help="Directory with one subfolder of audio files per class label.")
+    parser.add_argument("--cache-dir", help="Where to cache log-mel features (default: ./feature_cache/<dataset name>).")
+    parser.add_argument("--output", default="trained_model.pth")
+    parser.add_argument("--sample-rate", type=int, default=DEFAULT_SAMPLE_RATE)
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=0.001)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--val-fraction", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cache_dir = args.cache_dir or os.path.join("./feature_cache", os.path.basename(os.path.abspath(args.dataset_dir)))
+    index = prepare_feature_cache(args.dataset_dir, cache_dir, args.sample_rate)
+    class_labels = index["class_labels"]
+
+    items = list(index["items"])
+    random.Random(args.seed).shuffle(items)
+    num_val = int(len(items) * args.val_fraction)
+    val_items, train_items = items[:num_val], items[num_val:]
+    if not train_items:
+        raise SystemExit("No training samples left after the validation split.")
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    train_loader = _make_loader(FeatureShardDataset(cache_dir, index, train_items), args.batch_size, args.workers, shuffle=True)
+    val_loader = _make_loader(FeatureShardDataset(cache_dir, index, val_items), args.batch_size, args.workers, shuffle=False) if val_items else None
+
+    print(f"--- Training on {len(train_items)} clips ({len(val_items)} validation) across {len(class_labels)} classes on {device} ---")
+    torch.manual_seed(args.seed)
+    model = SimpleCNN(num_classes=len(class_labels)).to(device)
+    optimizer = optim.Adam(model.parameters(), lr=args.lr)
+    criterion = nn.CrossEntropyLoss()
+
+    for epoch in range(args.epochs):
+        model.train()
+        epoch_start = time.perf_counter()
+        running_loss = 0.0
+        seen = 0
+        for features, targets in train_loader:
+            features = features.to(device, non_blocking=True)
+            targets = targets.to(device, non_blocking=True)
+            optimizer.zero_grad()
+            loss = criterion(model(features), targets)
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item() * targets.size(0)
+            seen += targets.size(0)
+
+        elapsed = time.perf_counter() - epoch_start
+        message = f"  Epoch {epoch + 1}/{args.epochs}, Loss: {running_loss / seen:.4f}, {seen / elapsed:.1f} samples/s"
+        if val_loader is not None:
+            message += f", Val acc: {evaluate(model, val_loader, device):.2%}"
+        print(message)
+
+    model.eval()
+    print("Training complete.")
+
+    print(f"\nSaving model and metadata to '{args.output}'...")
+    torch.save({
+        'model_state_dict': model.cpu().state_dict(),
+        'num_classes': len(class_labels),
+        'class_labels': class_labels,
+        'sample_rate': args.sample_rate,
+    }, args.output)
+
+    print(f"\n✓ Success! Model and metadata saved to '{args.output}'")